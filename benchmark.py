@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark of the bots' turn loop.
+
+Frames are fed straight into hlt.GameMap and each bot's play_turn() is called, with no game environment on the other
+end.  The frames come from a recorded Halite replay (.hlt) or from seeded synthetic scenarios.  Player 1 is always the
+bot being measured.  A turn's latency covers decoding the frame, play_turn() and hlt.send_moves() (written to /dev/null).
+Allocations are measured in a second pass under tracemalloc, because tracing distorts the timings.
+
+    python3 benchmark.py                                    # every bot x size x player count x scenario
+    python3 benchmark.py --bots v26 --sizes 50 --players 6 --scenarios frontline --turns 50
+    python3 benchmark.py --replay game.hlt --bots v17 v26 --json baseline.json
+
+Scenarios:
+* opening:     one square per player, everything else neutral; the smallest territories and the largest fields.
+* territory:   Voronoi regions around each player covering most of the map, with empty seams where players meet.
+* fragmented:  ownership scattered cell by cell, so nearly every square is a border and frames have the most runs.
+* frontline:   full-height stripes per player separated by columns of empties, i.e. the longest possible frontlines.
+Between turns owned strengths grow by production, some squares empty out as if they had moved, and a few border
+squares change hands, so frames keep changing roughly the way real ones do.
+"""
+
+import argparse
+import contextlib
+import importlib
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+import hlt
+from simulator import encode_frame
+
+SCENARIOS = ('opening', 'territory', 'fragmented', 'frontline')
+
+
+def random_productions(width, height, rng):
+    "Productions 1-15ish in smooth patches, with a few barren squares."
+    bumps = [(rng.randrange(width), rng.randrange(height), rng.uniform(2, 10)) for _ in range(max(4, width * height // 60))]
+    productions = []
+    for y in range(height):
+        for x in range(width):
+            level = sum(peak / (1 + min(abs(x - bx), width - abs(x - bx)) + min(abs(y - by), height - abs(y - by))) for bx, by, peak in bumps)
+            productions.append(0 if rng.random() < 0.02 else max(1, min(15, int(level + rng.random() * 2))))
+    return productions
+
+
+def synthetic_game(scenario, width, height, players, seed, turns):
+    "(size_string, production_string, frames) for a synthetic scenario; frames[0] goes with the init."
+    rng = random.Random(seed)
+    size = width * height
+    productions = random_productions(width, height, rng)
+    owners = [0] * size
+    strengths = [rng.randint(5, 200) for _ in range(size)]
+    centers = [(int((player + rng.random() * 0.5) * width / players) % width, rng.randrange(height)) for player in range(players)]
+    if scenario == 'opening':
+        for player, (x, y) in enumerate(centers, 1):
+            owners[y * width + x], strengths[y * width + x] = player, 255
+    elif scenario == 'territory':
+        for y in range(height):
+            for x in range(width):
+                distances = sorted((min(abs(x - cx), width - abs(x - cx)) + min(abs(y - cy), height - abs(y - cy)), player) for player, (cx, cy) in enumerate(centers, 1))
+                (nearest, player), (second, _) = distances[0], distances[1]
+                cell = y * width + x
+                if second - nearest <= 1:
+                    strengths[cell] = 0                    # seam between two players
+                elif nearest < 0.35 * (width + height) / players ** 0.5:
+                    owners[cell], strengths[cell] = player, rng.randint(0, 255)
+    elif scenario == 'fragmented':
+        for cell in range(size):
+            if rng.random() < 0.7:
+                owners[cell], strengths[cell] = rng.randint(1, players), rng.randint(0, 255)
+            elif rng.random() < 0.3:
+                strengths[cell] = 0
+    elif scenario == 'frontline':
+        stripe = width / players
+        for cell in range(size):
+            x = cell % width
+            if x % stripe < 1:
+                strengths[cell] = 0                        # the empties between stripes
+            else:
+                owners[cell], strengths[cell] = int(x / stripe) + 1, rng.randint(0, 255)
+    else:
+        raise ValueError('unknown scenario ' + scenario)
+
+    frames = [encode_frame(owners, strengths)]
+    for _ in range(turns):
+        for cell in range(size):
+            if owners[cell]:
+                if rng.random() < 0.15:
+                    strengths[cell] = 0                    # moved away
+                else:
+                    strengths[cell] = min(255, strengths[cell] + productions[cell])
+        for _ in range(size // 100 + 1):
+            cell = rng.randrange(size)
+            neighbor = (cell + rng.choice((1, -1, width, -width))) % size
+            if owners[neighbor] != owners[cell]:
+                owners[cell], strengths[cell] = owners[neighbor], rng.randint(0, 50)
+        frames.append(encode_frame(owners, strengths))
+    return '%d %d' % (width, height), ' '.join(map(str, productions)), frames
+
+
+def replay_game(path):
+    "(size_string, production_string, frames, num_players) from a Halite replay file."
+    with open(path) as f:
+        replay = json.load(f)
+    width, height = replay['width'], replay['height']
+    productions = [production for row in replay['productions'] for production in row]
+    frames = []
+    for frame in replay['frames']:
+        cells = [cell for row in frame for cell in row]
+        frames.append(encode_frame([owner for owner, _ in cells], [strength for _, strength in cells]))
+    return '%d %d' % (width, height), ' '.join(map(str, productions)), frames, replay['num_players']
+
+
+def percentile(values, fraction):
+    "Nearest-rank percentile of a non-empty list."
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+
+def play(bot, argv, game, seed, measure):
+    """
+    Replays game through bot (an erdman_vXX module) as player 1.  measure is 'time' or 'memory'; returns the init cost
+    and one value per turn:  seconds, or peak bytes allocated during the turn.  A game ends early if player 1 has no
+    squares left.
+    """
+    size_string, production_string, frames = game
+    random.seed(seed)
+    values = []
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        if measure == 'memory':
+            tracemalloc.start()
+        start = time.perf_counter()
+        game_map = hlt.GameMap(size_string, production_string, frames[0], arrays=True)
+        bot.init(1, game_map, bot.parser.parse_args(argv))
+        init_cost = time.perf_counter() - start
+        for frame in frames[1:]:
+            if measure == 'memory':
+                tracemalloc.reset_peak()
+                baseline = tracemalloc.get_traced_memory()[0]
+            start = time.perf_counter()
+            game_map.get_frame(frame)
+            if 1 not in game_map.owners:
+                break
+            hlt.send_moves(game_map, bot.play_turn())
+            elapsed = time.perf_counter() - start
+            values.append(tracemalloc.get_traced_memory()[1] - baseline if measure == 'memory' else elapsed)
+        if measure == 'memory':
+            tracemalloc.stop()
+    return init_cost, values
+
+
+def run_case(bot_name, game, label, args):
+    bot = importlib.import_module('erdman_' + bot_name)
+    argv = ['--name', 'benchmark', '--turn_budget', 'inf'] + args.bot_args
+    init_cost, latencies = play(bot, argv, game, args.seed, 'time')
+    result = dict(label, bot=bot_name, turns=len(latencies), init_ms=1000 * init_cost)
+    if latencies:
+        result.update(p50_ms=1000 * percentile(latencies, 0.5), p99_ms=1000 * percentile(latencies, 0.99), max_ms=1000 * max(latencies))
+    if args.allocations:
+        _, peaks = play(bot, argv, game, args.seed, 'memory')
+        if peaks:
+            result.update(alloc_p50_kb=percentile(peaks, 0.5) / 1024, alloc_max_kb=max(peaks) / 1024)
+    return result
+
+
+def report(results):
+    columns = ('bot', 'map', 'players', 'scenario', 'turns', 'init_ms', 'p50_ms', 'p99_ms', 'max_ms', 'alloc_p50_kb', 'alloc_max_kb')
+    print(' '.join('%12s' % column for column in columns))
+    for result in results:
+        print(' '.join('%12.1f' % result[column] if isinstance(result.get(column), float) else '%12s' % result.get(column, '-') for column in columns))
+    total = sum(result.get('p50_ms', 0) for result in results)
+    print('sum of p50 over %d cases:  %.1f ms' % (len(results), total))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline per-turn latency and allocation benchmark for the erdman bots.')
+    parser.add_argument('--bots', nargs='+', default=['v12', 'v17', 'v26'], help='Bots to run, as in erdman_v26.py -> v26.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[20, 30, 40, 50], help='Square map sizes for the synthetic scenarios.')
+    parser.add_argument('--players', type=int, nargs='+', default=[2, 4, 6], help='Player counts for the synthetic scenarios.')
+    parser.add_argument('--scenarios', nargs='+', default=list(SCENARIOS), choices=SCENARIOS)
+    parser.add_argument('--turns', type=int, default=20, help='Turns per synthetic game.  Default is 20')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the synthetic maps and the bots\' random tie breaks.  Default is 0')
+    parser.add_argument('--replay', type=str, nargs='*', default=[], help='Halite replay files (.hlt) to replay instead of the synthetic scenarios.')
+    parser.add_argument('--no_allocations', dest='allocations', action='store_false', help='Skip the tracemalloc pass.')
+    parser.add_argument('--json', type=str, default=None, help='Also write the results to this file.')
+    parser.add_argument('bot_args', nargs=argparse.REMAINDER, help='Options after -- are passed to every bot.')
+    args = parser.parse_args()
+    if args.bot_args[:1] == ['--']:
+        args.bot_args = args.bot_args[1:]
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    cases = []
+    for path in args.replay:
+        size_string, production_string, frames, players = replay_game(path)
+        cases.append(((size_string, production_string, frames), dict(map=size_string.replace(' ', 'x'), players=players, scenario=os.path.basename(path))))
+    if not args.replay:
+        for scenario in args.scenarios:
+            for size in args.sizes:
+                for players in args.players:
+                    game = synthetic_game(scenario, size, size, players, args.seed, args.turns)
+                    cases.append((game, dict(map='%dx%d' % (size, size), players=players, scenario=scenario)))
+
+    results = []
+    for game, label in cases:
+        for bot_name in args.bots:
+            results.append(run_case(bot_name, game, label, args))
+            print(' '.join('%s=%s' % (key, round(value, 2) if isinstance(value, float) else value) for key, value in results[-1].items()), file=sys.stderr)
+    report(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=1)
+
+
+if __name__ == '__main__':
+    main()
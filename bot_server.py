@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Long-lived bot server, so a game doesn't pay for interpreter startup and imports.
+
+The server imports the bots once and plays a few warm-up turns of a synthetic game with each.  That way the modules
+they use are loaded and the interpreter's specialized bytecode is already in place.  It also builds the GameMap
+neighbor tables for the usual map sizes.  It then waits on a Unix socket.
+Each connection comes from bot_launcher.py, which the game environment started as the bot's command.  The server
+forks a game process per connection, which takes over the launcher's stdin, stdout and stderr (passed over the
+socket), changes to the launcher's working directory and runs the bot's main() with the launcher's arguments.  The
+bot reads and writes the environment's pipes itself, so the protocol is exactly the one it speaks when started
+directly.  Log, telemetry and recording files land where they would have.
+
+    python3 bot_server.py &                 # once
+    python3 -S bot_launcher.py v26 --name roibot      # per game, as the bot command
+
+Every game process starts from the server's pristine state, so games can't leak into each other, and any number can
+run at once.  Exited game processes are reaped automatically.
+"""
+
+import argparse
+import atexit
+import importlib
+import logging
+import os
+import random
+import signal
+import socket
+import sys
+import traceback
+
+import hlt
+from bot_launcher import SOCKET
+from benchmark import synthetic_game
+
+
+def warm_up(bot, turns):
+    "Plays turns of a small synthetic game with bot, without writing anything, to get its code paths warm."
+    size_string, production_string, frames = synthetic_game('territory', 30, 30, 2, 0, turns)
+    game_map = hlt.GameMap(size_string, production_string, frames[0], arrays=True)
+    bot.init(1, game_map, bot.parser.parse_args(['--name', 'warmup', '--turn_budget', 'inf']))
+    for frame in frames[1:]:
+        game_map.get_frame(frame)
+        bot.play_turn()
+
+
+def play_game(connection, bots):
+    "In a forked game process:  runs the launcher's bot on the launcher's pipes, reports the exit status and exits."
+    code = 1
+    try:
+        request, fds, _, _ = socket.recv_fds(connection, 65536, 3)
+        for fd, standard in zip(fds, (0, 1, 2)):
+            os.dup2(fd, standard)
+            os.close(fd)
+        sys.stdin, sys.stdout, sys.stderr = open(0, closefd=False), open(1, 'w', closefd=False), open(2, 'w', closefd=False, buffering=1)
+        cwd, name, *argv = map(os.fsdecode, request.split(b'\0'))
+        os.chdir(cwd)
+        if name not in bots:
+            raise SystemExit('bot_server: no bot %r, serving %s' % (name, ', '.join(sorted(bots))))
+        bot = bots[name]
+        sys.argv = [bot.__file__] + argv
+        random.seed()                       # not the server's random state, which every game would otherwise share
+        logging.root.handlers.clear()       # so the bot's logging.basicConfig takes effect, as in a fresh process
+        bot.main()
+        code = 0
+    except SystemExit as exit:
+        if isinstance(exit.code, str):
+            print(exit.code, file=sys.stderr)
+        code = exit.code if isinstance(exit.code, int) else int(exit.code is not None)
+    except BaseException:
+        traceback.print_exc()
+    finally:
+        atexit._run_exitfuncs()             # the bot's own handlers (telemetry, recordings), as at a normal exit
+        for stream in (sys.stdout, sys.stderr):
+            try:
+                stream.flush()
+            except (OSError, ValueError):
+                pass
+        try:
+            connection.sendall(b'%d\n' % code)
+        except OSError:
+            pass                            # the launcher is gone already
+        os._exit(code)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serves the erdman bots to bot_launcher.py over a Unix socket, a forked process per game.')
+    parser.add_argument('--socket', type=str, default=SOCKET, help='Socket path.  Default is $HALITE_BOT_SOCKET or %s' % SOCKET)
+    parser.add_argument('--bots', nargs='+', default=['v12', 'v17', 'v26'], help='Bots to serve, as in erdman_v26.py -> v26.')
+    parser.add_argument('--warmup_turns', type=int, default=10, help='Synthetic turns each bot plays at startup.  Default is 10')
+    parser.add_argument('--sizes', type=int, nargs='*', default=[20, 25, 30, 35, 40, 45, 50], help='Square map sizes whose GameMap tables are built before forking; other sizes are built per game.  Default is 20 to 50 by 5')
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    bots = {name: importlib.import_module('erdman_' + name) for name in args.bots}
+    importlib.import_module('planner')      # which v26 only imports for --plan_workers
+    for bot in bots.values():
+        if args.warmup_turns:
+            warm_up(bot, args.warmup_turns)
+    for size in args.sizes:
+        hlt.GameMap('%d %d' % (size, size), ' '.join(['1'] * size * size), b'%d 0 ' % (size * size) + b'0 ' * size * size, arrays=True)     # caches the tables, see hlt._tables
+
+    if os.path.exists(args.socket):
+        os.unlink(args.socket)
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(args.socket)
+    listener.listen(64)
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)      # game processes are reaped as they exit
+    print('bot_server: serving %s on %s' % (', '.join(bots), args.socket), file=sys.stderr)
+    while True:
+        connection, _ = listener.accept()
+        if os.fork() == 0:
+            listener.close()
+            play_game(connection, bots)
+        connection.close()
+
+
+if __name__ == '__main__':
+    main()
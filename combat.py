@@ -0,0 +1,63 @@
+"""
+Per-turn combat-zone index for v26's dangerous_empties and strategic stilling.
+
+A combat cell is an empty (or enemy) square with enemy strength on or next to it.  It becomes dangerous once any of
+my moves has committed strength onto or next to it.  Rather than rescanning the radius-2 neighborhood of every square
+being assigned, the index is built once per turn from the feature layers and then kept current by commit(), which
+touches only the five cells around the committed target (and the radius-2 diamond of a cell that turns dangerous).
+"""
+
+from operator import itemgetter
+
+
+class CombatIndex:
+    "Dangerous-cell bookkeeping for player my_id.  Call update() once per turn after FeatureMaps.update(), then commit() for each move's target."
+
+    def __init__(self, game_map, my_id):
+        self.game_map = game_map
+        self.my_id = my_id
+        self._rolls = [itemgetter(*game_map.adjacency[direction::5]) for direction in range(5)]
+
+    def update(self, features):
+        game_map = self.game_map
+        size = game_map.size
+        enemy_strengths = bytes(map(min, game_map.strengths, (255 * flag for flag in features.enemy)))
+        bordering = list(map(sum, zip(*(roll(enemy_strengths) for roll in self._rolls))))   # over the cell and its 4 neighbors
+        self.enemy_strength = bytes(map(min, bordering, [255] * size))
+        contested = map(int.__or__, features.empty, features.enemy)
+        self.combat = bytes(flag and strength > 0 for flag, strength in zip(contested, bordering))
+        self.strong_enemy = bytes(flag and strength >= 3 * production for flag, strength, production in zip(features.enemy, game_map.strengths, game_map.productions))
+        self.empty = features.empty
+        self.committed = bytearray(size)     # cells some move has targeted this turn
+        self.dangerous = bytearray(size)
+        self.pressure = bytearray(size)      # enemy_strength of dangerous cells, 0 elsewhere
+        self.dangerous_nearby = [0] * size   # dangerous cells within distance 2, not counting the cell itself
+        self.marked = 0                      # cells that turned dangerous this turn
+
+    def commit(self, target):
+        "Records that a move has committed strength to target."
+        if self.committed[target]:
+            return
+        self.committed[target] = 1
+        combat, dangerous = self.combat, self.dangerous
+        for cell in self.game_map.adjacent_self[target]:
+            if combat[cell] and not dangerous[cell]:
+                dangerous[cell] = 1
+                self.marked += 1
+                self.pressure[cell] = self.enemy_strength[cell]
+                for neighbor in self.game_map.nearby[cell]:
+                    self.dangerous_nearby[neighbor] += 1
+
+    def exposure(self, cell, square):
+        "Enemy strength of the dangerous cells on or next to cell, other than square itself."
+        pressure = self.pressure
+        return sum(pressure[neighbor] for neighbor in self.game_map.adjacent_self[cell] if neighbor != square)
+
+    def strategic_still(self, square):
+        "True if square borders more than one empty, and more than one distinct enemy square of strength >= 3 * production borders those empties."
+        adjacent, empty = self.game_map.adjacent, self.empty
+        empties = [neighbor for neighbor in adjacent[square] if empty[neighbor]]
+        if len(empties) < 2:
+            return False
+        strong_enemy = self.strong_enemy
+        return len(set(n2 for neighbor in empties for n2 in adjacent[neighbor] if strong_enemy[n2])) > 1
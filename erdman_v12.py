@@ -2,7 +2,11 @@
 
 import hlt
 from hlt import NORTH, EAST, SOUTH, WEST, STILL, Move, Square
-import heapq
+import potential_field
+from features import FeatureMaps
+from scheduler import TurnScheduler
+from telemetry import Telemetry
+import recording
 import random
 import time
 from collections import defaultdict
@@ -16,89 +20,124 @@ parser.add_argument('--alpha', type=float, nargs='?', default=0.25, help='Alpha
 parser.add_argument('--potential_degradation_step', type=float, nargs='?', default=0.5, help='Times friendly_distance ** 2 is potential degradation.  Default is 0.5')  #Default was 1.0
 parser.add_argument('--enemy_ROI', type=float, nargs='?', default=-1.0, help='Amount of ROI to include for each enemy adjacent to an empty square.  Default is -1.0')
 parser.add_argument('--hold_until', type=int, nargs='?', default=5, help='Hold square STILL until strength >= args.hold_until * production.  Default is 5.')
-args = parser.parse_args()
-logging.basicConfig(filename=args.name+'.log', level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
-logging.debug(str(args))
-
-myID, game_map = hlt.get_init()
-if game_map.width == 20 or game_map.height == 20 or game_map.starting_player_count >= 4:
-    args.hold_until = 6
-    args.potential_degradation_step = 0.4
-    assert args.hold_until == 6
-    assert args.potential_degradation_step == 0.4
-hlt.send_init(args.name)
+parser.add_argument('--turn_budget', type=float, nargs='?', default=1.0, help='Seconds allowed per turn by the game environment.  Moves still unassigned near the deadline are left STILL.  Default is 1.0')
+parser.add_argument('--log_level', type=str, nargs='?', default='DEBUG', help='Logging level for NAME.log.  Per-square messages are only built at DEBUG.  Default is DEBUG')
+parser.add_argument('--telemetry', action='store_true', default=False, help='Records per-turn phase timings, counts and end-of-turn RSS (resident memory, not a peak) to NAME.telemetry.jsonl.')
+parser.add_argument('--telemetry_every', type=int, nargs='?', default=10, help='Writes telemetry every N turns, as well as when its buffer fills and at exit (which a killed bot never reaches).  0 writes only then.  Default is 10')
+parser.add_argument('--record', action='store_true', default=False, help='Records every frame and the moves sent to NAME.hrec (see recording.py).')
+parser.add_argument('--seed', type=int, nargs='?', default=None, help='Seed for breaking ties in the potential field.  Default is None, which breaks ties by cell index.')
 
 
 def assign_move(square):
-    potential, _, best_d, target = min((pf_map[neighbor] + (float('inf') if destinations[neighbor] + square.strength > 255 else 0), random.random(), direction, neighbor) for direction, neighbor in enumerate(game_map.neighbors(square))) # the random number breaks ties randomly
-    staying_is_bad = (square.strength + square.production + destinations.get(square, 0)) > 255
+    # squares are integer cell indices into game_map's flat owner/strength/production arrays
+    strength, production = strengths[square], productions[square]
+    potential, _, best_d, target = min((pf_map[neighbor] + (float('inf') if destinations[neighbor] + strength > 255 else 0), random.random(), direction, neighbor) for direction, neighbor in enumerate(game_map.cell_neighbors(square))) # the random number breaks ties randomly
+    staying_is_bad = (strength + production + destinations.get(square, 0)) > 255
     if potential == float('inf'):
         if staying_is_bad:
             # all 5 destinations are bad, choose least bad
-            _, direction, target = min((square.strength + destinations.get(neighbor,0) + (square.production if direction == 0 else 0), direction, neighbor) for direction, neighbor in enumerate(game_map.neighbors(square, include_self=True)))
+            _, direction, target = min((strength + destinations.get(neighbor,0) + (production if direction == 0 else 0), direction, neighbor) for direction, neighbor in enumerate(game_map.cell_neighbors(square, include_self=True)))
             return Move(square, direction)
         else:
             # OK to just stay
             return Move(square, STILL)
             
-    if not staying_is_bad and any(Move(neighbor, best_d) in moves for neighbor in game_map.neighbors(square)):   #do not follow or mimic neighbors
+    if not staying_is_bad and any(Move(neighbor, best_d) in moves for neighbor in game_map.cell_neighbors(square)):   #do not follow or mimic neighbors
         return Move(square, STILL)
 
     if not staying_is_bad and destinations[square] > 0:
         return Move(square, STILL)
 
-    if staying_is_bad and any(destinations[neighbor] + square.strength < 256 for _, neighbor in originations[square]):
+    if staying_is_bad and any(destinations[neighbor] + strength < 256 for _, neighbor in originations[square]):
         return Move(square, min(originations[square], key = lambda tup: destinations[tup[1]])[0])
 
     if staying_is_bad:
         return Move(square, best_d)
       
-    if target.owner != myID:  #an opponent -- actually can never be adjacent to opponent, it's always me or a "zero" owner square
-        if (square.strength == 255) or (square.strength > target.strength):
+    if owners[target] != myID:  #an opponent -- actually can never be adjacent to opponent, it's always me or a "zero" owner square
+        if (strength == 255) or (strength > strengths[target]):
             return Move(square, best_d)
-    elif square.strength >= square.production * args.hold_until:   #target square is friendly, and we are strong enough to move
+    elif strength >= production * args.hold_until:   #target square is friendly, and we are strong enough to move
         return Move(square, best_d)
 
     return Move(square, STILL)
 
-def initial_potential(square):
-    # if empty, correlate with utility as an attacking square (if there are neighboring enemies)
-    if square.owner == square.strength == 0:
-        return sum(args.enemy_ROI for neighbor in game_map.neighbors(square) if neighbor.owner not in (0, myID))
-    elif square.production == 0:
-        return float('inf')
-    else:
-        return square.strength / square.production
+def init(my_id, new_game_map, options):
+    "Sets the bot up for a game on new_game_map, after get_init and before send_init.  options are parsed by parser."
+    global args, myID, game_map, owners, strengths, productions, features, field, scheduler, telemetry, turn
+    args = options
+    myID, game_map = my_id, new_game_map
+    owners, strengths, productions = game_map.owners, game_map.strengths, game_map.productions
+    if game_map.width == 20 or game_map.height == 20 or game_map.starting_player_count >= 4:
+        args.hold_until = 6
+        args.potential_degradation_step = 0.4
+        assert args.hold_until == 6
+        assert args.potential_degradation_step == 0.4
+    features = FeatureMaps(game_map, myID)
+    field = potential_field.PotentialField(game_map, args.alpha, args.potential_degradation_step, neutral_only=False, seed=args.seed)
+    scheduler = TurnScheduler(args.turn_budget)
+    telemetry = Telemetry(args.name + '.telemetry.jsonl', enabled=args.telemetry, every=args.telemetry_every)
+    if args.record:
+        game_map.recorder = recording.Recorder(args.name + '.hrec', game_map, myID)
+    # warm up on the init frame, which is also turn 1's:  first-use costs stay out of the timed turns, and the scheduler starts with estimates
+    scheduler.start()
+    features.update()
+    scheduler.phase('features')
+    field.compute(myID, features.initial_potential(args.enemy_ROI, neutral_only=False))
+    scheduler.phase('field')
+    turn = 0
 
-turn = 0
-while True:
-    start_time = time.time()
+def play_turn():
+    "Plays the frame game_map was just updated with, returning the direction of every square (see hlt.send_moves)."
+    global turn, moves, pf_map, destinations, originations
+    scheduler.start(game_map.received)
+    scheduler.phase('parse')
     turn += 1
     moves = []
-    game_map.get_frame()
-    frontier = [(initial_potential(square), random.random(), initial_potential(square), 0, square) for square in game_map if square.owner != myID]
-    pf_map = dict()
-    heapq.heapify(frontier)
-    while len(pf_map) < game_map.width * game_map.height:
-        _, _, square_potential, friendly_distance, square = heapq.heappop(frontier)
-        if square not in pf_map:
-            pf_map[square] = square_potential + args.potential_degradation_step * friendly_distance ** 2
-            for neighbor in game_map.neighbors(square):
-                if neighbor.owner != myID:
-                    neighbor_potential  = (1 - args.alpha) * square_potential + args.alpha * (float('inf') if not neighbor.production else neighbor.strength / neighbor.production)
-                    heapq.heappush(frontier, (neighbor_potential, random.random(), neighbor_potential, friendly_distance, neighbor))
-                else:
-                    neighbor_potential  = square_potential + args.potential_degradation_step * (friendly_distance + 1) ** 2 
-                    heapq.heappush(frontier, (neighbor_potential, random.random(), square_potential, friendly_distance + 1, neighbor))
+    features.update()
+    scheduler.phase('features')
+    field.compute(myID, features.initial_potential(args.enemy_ROI, neutral_only=False))
+    pf_map = field.degraded()
+    scheduler.phase('field')
     moves = set() #list()
+    directions = game_map.blank_moves()
     destinations = defaultdict(int)
     originations = defaultdict(list)
-    for square in sorted((square for square in game_map if square.owner == myID and square.strength > 0), key=lambda x: x.strength, reverse=True):
+    deadline = scheduler.deadline()
+    for square in sorted((square for square in range(game_map.size) if owners[square] == myID and strengths[square] > 0), key=lambda x: strengths[x], reverse=True):
+        if time.monotonic() > deadline:    # out of time:  the weaker squares left over just stay STILL
+            scheduler.degrade('partial_moves')
+            break
         move = assign_move(square)
         moves.add(move)
-        target = game_map.get_target(square, move.direction)
-        destinations[target] += square.strength
+        directions[square] = move.direction
+        target = game_map.cell_target(square, move.direction)
+        destinations[target] += strengths[square]
         originations[target].append((hlt.opposite_cardinal(move.direction), square))
-    hlt.send_frame(moves)
-    
-    logging.debug(str(turn) + ' :: ' + str(int(1000 * (time.time() - start_time))))
+    scheduler.phase('assign')
+    return directions
+
+def end_turn(directions):
+    "Per-turn bookkeeping once the moves have been sent."
+    scheduler.phase('send')
+    if scheduler.degraded:
+        logging.debug('%d :: degraded %s', turn, ', '.join(scheduler.degraded))
+    logging.debug('%d :: %d', turn, 1000 * scheduler.elapsed())
+    if telemetry.enabled:
+        squares = game_map.size - directions.count(hlt.NO_MOVE)
+        telemetry.end_turn(turn, scheduler.durations, squares=squares, moved=squares - directions.count(STILL), pushes=field.pushes, degraded=len(scheduler.degraded))
+
+def main():
+    options = parser.parse_args()
+    logging.basicConfig(filename=options.name+'.log', level=getattr(logging, options.log_level.upper()), format='%(asctime)s - %(levelname)s - %(message)s')
+    logging.debug(str(options))
+    init(*hlt.get_init(arrays=True), options)
+    hlt.send_init(args.name)
+    while True:
+        game_map.get_frame()
+        directions = play_turn()
+        hlt.send_moves(game_map, directions)
+        end_turn(directions)
+
+if __name__ == '__main__':
+    main()
@@ -2,7 +2,13 @@
 
 import hlt
 from hlt import NORTH, EAST, SOUTH, WEST, STILL, Move, Square
-import heapq
+import potential_field
+from features import FeatureMaps
+from combat import CombatIndex
+from scheduler import TurnScheduler
+from telemetry import Telemetry
+from move_solver import MoveSolver
+import recording
 import random
 import time
 from collections import defaultdict
@@ -18,97 +24,153 @@ parser.add_argument('--enemy_ROI', type=float, nargs='?', default=-0.5, help='Am
 parser.add_argument('--hold_until', type=int, nargs='?', default=5, help='Hold square STILL until strength >= args.hold_until * production.  Default is 5.')
 parser.add_argument('--int_max', type=float, nargs='?', default=0.45, help='Max proportion of interior pieces allowed to move.')
 parser.add_argument('--int_min', type=float, nargs='?', default=0.01, help='Min proportion of interior pieces allowed to move.')
-args = parser.parse_args()
-logging.basicConfig(filename=args.name+'.log', level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
-logging.debug(str(args))
-
-myID, game_map = hlt.get_init()
-hlt.send_init(args.name)
+parser.add_argument('--turn_budget', type=float, nargs='?', default=1.0, help='Seconds allowed per turn by the game environment.  Moves still unassigned near the deadline are left STILL.  Default is 1.0')
+parser.add_argument('--move_solver', type=str, nargs='?', default='greedy', choices=('greedy', 'batched'), help='greedy assigns squares one at a time, strongest first; batched solves all moves at once (see move_solver.py).  Default is greedy')
+parser.add_argument('--log_level', type=str, nargs='?', default='DEBUG', help='Logging level for NAME.log.  Per-square messages are only built at DEBUG.  Default is DEBUG')
+parser.add_argument('--telemetry', action='store_true', default=False, help='Records per-turn phase timings, counts and end-of-turn RSS (resident memory, not a peak) to NAME.telemetry.jsonl.')
+parser.add_argument('--telemetry_every', type=int, nargs='?', default=10, help='Writes telemetry every N turns, as well as when its buffer fills and at exit (which a killed bot never reaches).  0 writes only then.  Default is 10')
+parser.add_argument('--record', action='store_true', default=False, help='Records every frame and the moves sent to NAME.hrec (see recording.py).')
+parser.add_argument('--seed', type=int, nargs='?', default=None, help='Seed for breaking ties in the potential field.  Default is None, which breaks ties by cell index.')
 
 def assign_move(square):
-    available_moves = sorted((degrade_potential(*pf_map[neighbor]) + 10000 * max(destinations[neighbor] + square.strength - 255, 0), random.random(), direction, neighbor) for direction, neighbor in enumerate(game_map.neighbors(square))) # the random number breaks ties randomly
+    # squares are integer cell indices into game_map's flat owner/strength/production arrays
+    strength, production = strengths[square], productions[square]
+    available_moves = sorted((pf_map[neighbor] + 10000 * max(destinations[neighbor] + strength - 255, 0), random.random(), direction, neighbor) for direction, neighbor in enumerate(game_map.cell_neighbors(square))) # the random number breaks ties randomly
     potential, _, best_d, target = available_moves.pop(0)
 
     if potential > 9000:   # all 4 remaining destinations are bad, just go with the least bad; what about still?
         if destinations[square] < destinations[target]:
             best_d = STILL
-        logging.debug(str(turn) + ' :: Least Bad!  ' + str(square) + ' went ' + str(best_d))
+        if verbose:
+            logging.debug(str(turn) + ' :: Least Bad!  ' + str(game_map.square(square)) + ' went ' + str(best_d))
         return Move(square, best_d)
 
-    staying_is_bad = (square.strength + destinations[square]) > 255
+    staying_is_bad = (strength + destinations[square]) > 255
     if not staying_is_bad and destinations[square] > 0:     #safely meld with all oncoming
         return Move(square, STILL)
 
-    dangerous_empties = set(neighbor for neighbor in game_map.neighbors(square, n=2) \
-                            if neighbor.owner == neighbor.strength == 0 \
-                            and any(n2.owner not in (0, myID) and n2.strength > 0 for n2 in game_map.neighbors(neighbor)) \
-                            and any(destinations[n2] > 0 for n2 in game_map.neighbors(neighbor, include_self=True)))
+    dangerous_empties = set(neighbor for neighbor in game_map.cell_neighbors(square, n=2) \
+                            if owners[neighbor] == strengths[neighbor] == 0 \
+                            and any(owners[n2] not in (0, myID) and strengths[n2] > 0 for n2 in game_map.cell_neighbors(neighbor)) \
+                            and any(destinations[n2] > 0 for n2 in game_map.cell_neighbors(neighbor, include_self=True)))
 
     if dangerous_empties:
         # recalculating available_moves to consider still along with the 4 cardinals by same criteria
-        available_moves = sorted((degrade_potential(*pf_map[neighbor]) + 10000 * max(destinations[neighbor] + square.strength - 255, 0), random.random(), direction, neighbor) for direction, neighbor in enumerate(game_map.neighbors(square, include_self=True))) # the random number breaks ties randomly
-        while available_moves and any(neighbor in dangerous_empties for neighbor in game_map.neighbors(target, include_self=True)):
+        available_moves = sorted((pf_map[neighbor] + 10000 * max(destinations[neighbor] + strength - 255, 0), random.random(), direction, neighbor) for direction, neighbor in enumerate(game_map.cell_neighbors(square, include_self=True))) # the random number breaks ties randomly
+        while available_moves and any(neighbor in dangerous_empties for neighbor in game_map.cell_neighbors(target, include_self=True)):
             _, _, best_d, target = available_moves.pop(0)
-            logging.debug(str(turn) + ' :: Dangerous Empties!  ' + str(square) + ' trying to go ' + str(best_d))
+            if verbose:
+                logging.debug(str(turn) + ' :: Dangerous Empties!  ' + str(game_map.square(square)) + ' trying to go ' + str(best_d))
         return Move(square, best_d)
 
     if staying_is_bad:
-        while available_moves and target.owner != myID and square.strength + destinations[target] < min(target.strength, 254):
+        while available_moves and owners[target] != myID and strength + destinations[target] < min(strengths[target], 254):
             potential, _, best_d, target = available_moves.pop(0)
         return Move(square, best_d)
 
-    if target.owner != myID:  #an opponent -- actually can never be adjacent to opponent, it's always me or a "zero" owner square
-        if ((square.strength == 255) or (square.strength + destinations[target] > target.strength)) and destinations[target] + square.strength <= 255 and square.strength >= 2 * square.production and (destinations[target] == 0 or square.strength >= args.hold_until * square.production):
+    if owners[target] != myID:  #an opponent -- actually can never be adjacent to opponent, it's always me or a "zero" owner square
+        if ((strength == 255) or (strength + destinations[target] > strengths[target])) and destinations[target] + strength <= 255 and strength >= 2 * production and (destinations[target] == 0 or strength >= args.hold_until * production):
             return Move(square, best_d)
-    elif square.strength >= strength_hurdle and square.strength >= args.hold_until * square.production:   #target square is friendly, and we are strong enough to move
+    elif strength >= strength_hurdle and strength >= args.hold_until * production:   #target square is friendly, and we are strong enough to move
         return Move(square, best_d)
 
     return Move(square, STILL)
 
-def initial_potential(square):
-    # if empty, correlate with utility as an attacking square (if there are neighboring enemies)
-    if square.owner == square.strength == 0:
-        return sum(args.enemy_ROI for neighbor in game_map.neighbors(square) if neighbor.owner not in (0, myID))
-    elif square.production == 0 or square.owner not in (0,myID):
-        return float('inf')
-    else:
-        return square.strength / square.production
+def wants_to_move(square):
+    "Per direction, whether assign_move would move square that way if it were its best move, leaving out what depends on the squares assigned before it, for --move_solver batched."
+    strength, production = strengths[square], productions[square]
+    friendly = strength >= strength_hurdle and strength >= args.hold_until * production
+    border = strength >= 2 * production     # and it takes the square, which the solver checks (take)
+    return tuple(friendly if owners[target] == myID else border for target in game_map.cell_neighbors(square))
 
-def degrade_potential(potential, distance):
-    return potential + args.potential_degradation_step * distance ** 2
+def init(my_id, new_game_map, options):
+    "Sets the bot up for a game on new_game_map, after get_init and before send_init.  options are parsed by parser."
+    global args, verbose, myID, game_map, owners, strengths, productions, features, combat, field, solver, scheduler, telemetry, turn
+    args = options
+    myID, game_map = my_id, new_game_map
+    verbose = logging.getLogger().isEnabledFor(logging.DEBUG)     # skip building per-square log messages nobody will see
+    owners, strengths, productions = game_map.owners, game_map.strengths, game_map.productions
+    features = FeatureMaps(game_map, myID)
+    solver = MoveSolver(game_map, myID, rng=random)
+    combat = CombatIndex(game_map, myID)
+    field = potential_field.PotentialField(game_map, args.alpha, args.potential_degradation_step, neutral_only=True, seed=args.seed)
+    scheduler = TurnScheduler(args.turn_budget)
+    telemetry = Telemetry(args.name + '.telemetry.jsonl', enabled=args.telemetry, every=args.telemetry_every)
+    if args.record:
+        game_map.recorder = recording.Recorder(args.name + '.hrec', game_map, myID)
+    # warm up on the init frame, which is also turn 1's:  first-use costs stay out of the timed turns, and the scheduler starts with estimates
+    scheduler.start()
+    features.update()
+    scheduler.phase('features')
+    field.compute(myID, features.initial_potential(args.enemy_ROI, neutral_only=True))
+    scheduler.phase('field')
+    turn = 0
 
-turn = 0
-while True:
-    start_time = time.time()
+def play_turn():
+    "Plays the frame game_map was just updated with, returning the direction of every square (see hlt.send_moves)."
+    global turn, pf_map, destinations, strength_hurdle
+    scheduler.start(game_map.received)
+    scheduler.phase('parse')
     turn += 1
     moves = []
-    game_map.get_frame()
-    frontier = [(initial_potential(square), random.random(), initial_potential(square), 0, square) for square in game_map if square.owner != myID]
-    pf_map = dict()
-    heapq.heapify(frontier)
-    while len(pf_map) < game_map.width * game_map.height:
-        _, _, square_potential, friendly_distance, square = heapq.heappop(frontier)
-        if square not in pf_map:
-            pf_map[square] = (square_potential, friendly_distance)
-            for neighbor in game_map.neighbors(square):
-                if neighbor.owner != myID:
-                    neighbor_potential  = (1 - args.alpha) * square_potential + args.alpha * neighbor.strength / neighbor.production if neighbor.production and neighbor.owner == 0 else float('inf')
-                    heapq.heappush(frontier, (neighbor_potential, random.random(), neighbor_potential, friendly_distance, neighbor))
-                else:
-                    neighbor_potential  = degrade_potential(square_potential, friendly_distance + 1)
-                    heapq.heappush(frontier, (neighbor_potential, random.random(), square_potential, friendly_distance + 1, neighbor))
+    features.update()
+    scheduler.phase('features')
+    field.compute(myID, features.initial_potential(args.enemy_ROI, neutral_only=True))
+    pf_map = field.degraded()
+    scheduler.phase('field')
     moves = set()
+    directions = game_map.blank_moves()
     destinations = defaultdict(int)
     originations = defaultdict(list)
-    interior_strengths = [square.strength for square in game_map if square.owner == myID and min(game_map.neighbors(square), key=lambda x: degrade_potential(*pf_map[x])).owner == myID]
+    interior_strengths = [strengths[square] for square in range(game_map.size) if owners[square] == myID and owners[min(game_map.cell_neighbors(square), key=lambda x: pf_map[x])] == myID]
     interior_strengths.sort(reverse=True)
     percentile = (1 - len(interior_strengths) / (50 * 50)) * (args.int_max - args.int_min) + args.int_min
     strength_hurdle = interior_strengths[int(len(interior_strengths) * percentile)] if interior_strengths else 0
-    for square in sorted((square for square in game_map if square.owner == myID and square.strength > 0), key=lambda x: (x.strength, -pf_map[square][1]), reverse=True):  #when tied strength, move closest first
-        move = assign_move(square)
-        moves.add(move)
-        target = game_map.get_target(square, move.direction)
-        destinations[target] += square.strength
-        originations[target].append((hlt.opposite_cardinal(move.direction), square))
-    hlt.send_frame(moves)
-    logging.debug(str(turn) + ' :: ' + str(int(1000 * (time.time() - start_time))))
+    deadline = scheduler.deadline()
+    squares = sorted((square for square in range(game_map.size) if owners[square] == myID and strengths[square] > 0), key=lambda x: strengths[x], reverse=True)  #ties stay in cell order:  the original "closest first" key read a stale pf_map entry, the same for every square
+    if args.move_solver == 'batched':
+        moving = {square: wants_to_move(square) for square in squares}
+        take = meld = dict.fromkeys(squares, True)
+        follow = {square: strengths[square] >= args.hold_until * productions[square] for square in squares}
+        combat.update(features)     # assign_move's dangerous empties, as combat cells:  watched within distance 2 whichever way a square goes
+        watch = {square: (game_map.nearby[square],) * 4 for square in squares}
+        rows = solver.rows(squares, pf_map)
+        solver.solve(squares, rows, directions, deadline, moving, take=take, follow=follow, meld=meld, combat=combat, watch=watch, fight_rows=rows)
+    else:
+        for square in squares:
+            if time.monotonic() > deadline:    # out of time:  the weaker squares left over just stay STILL
+                scheduler.degrade('partial_moves')
+                break
+            move = assign_move(square)
+            moves.add(move)
+            directions[square] = move.direction
+            target = game_map.cell_target(square, move.direction)
+            destinations[target] += strengths[square]
+            originations[target].append((hlt.opposite_cardinal(move.direction), square))
+    scheduler.phase('assign')
+    return directions
+
+def end_turn(directions):
+    "Per-turn bookkeeping once the moves have been sent."
+    scheduler.phase('send')
+    if scheduler.degraded:
+        logging.debug('%d :: degraded %s', turn, ', '.join(scheduler.degraded))
+    logging.debug('%d :: %d', turn, 1000 * scheduler.elapsed())
+    if telemetry.enabled:
+        squares = game_map.size - directions.count(hlt.NO_MOVE)
+        telemetry.end_turn(turn, scheduler.durations, squares=squares, moved=squares - directions.count(STILL), pushes=field.pushes, degraded=len(scheduler.degraded))
+
+def main():
+    options = parser.parse_args()
+    logging.basicConfig(filename=options.name+'.log', level=getattr(logging, options.log_level.upper()), format='%(asctime)s - %(levelname)s - %(message)s')
+    logging.debug(str(options))
+    init(*hlt.get_init(arrays=True), options)
+    hlt.send_init(args.name)
+    while True:
+        game_map.get_frame()
+        directions = play_turn()
+        hlt.send_moves(game_map, directions)
+        end_turn(directions)
+
+if __name__ == '__main__':
+    main()
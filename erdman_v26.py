@@ -2,11 +2,18 @@
 
 import hlt
 from hlt import NORTH, EAST, SOUTH, WEST, STILL, Move, Square
-import heapq
+import potential_field
+from features import FeatureMaps
+from combat import CombatIndex
+from red_green import RedGreenTrees
+from scheduler import TurnScheduler
+from telemetry import Telemetry
+from move_solver import MoveSolver
+import recording
 import random
 import time
 from collections import defaultdict
-from itertools import chain, groupby
+from itertools import chain, compress
 import logging
 import argparse
 import json
@@ -22,168 +29,244 @@ parser.add_argument('--int_max', type=float, nargs='?', default=0.45, help='Max
 parser.add_argument('--int_min', type=float, nargs='?', default=0.01, help='Min proportion of interior pieces allowed to move.')
 parser.add_argument('--enable_strategic_stilling', action='store_true', default=True, help='Enables strategic stilling behavior.')
 parser.add_argument('--enable_red_green', action='store_true',default=True, help='Enables red-green trees for timing mining moves.')
-args = parser.parse_args()
-combat_hold_until = args.hold_until
-logging.basicConfig(filename=args.name+'.log', level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
-logging.debug(str(args))
-
-myID, game_map = hlt.get_init()
-hlt.send_init(args.name)
+parser.add_argument('--heads_up_fight', action='store_true', default=False, help='Drops the wall (the non-aggression pact) once only two players are left in the game.')
+parser.add_argument('--incremental_pf', action='store_true', default=False, help='Repair the previous turn\'s potential field from the changed cells instead of rebuilding it every turn.')
+parser.add_argument('--layer_weights', type=float, nargs=3, default=None, metavar=('MINING', 'COMBAT', 'BORDER'), help='Builds pf_map from the potential field\'s stacked layers with these weights (see PotentialField.stack).  Default is None, which is the same as 1 ENEMY_ROI POTENTIAL_DEGRADATION_STEP')
+parser.add_argument('--turn_budget', type=float, nargs='?', default=1.0, help='Seconds allowed per turn by the game environment.  Optional phases are skipped when they would not fit.  Default is 1.0')
+parser.add_argument('--move_solver', type=str, nargs='?', default='greedy', choices=('greedy', 'batched'), help='greedy assigns squares one at a time, strongest first; batched solves all moves at once (see move_solver.py).  Default is greedy')
+parser.add_argument('--log_level', type=str, nargs='?', default='DEBUG', help='Logging level for NAME.log.  Per-square messages are only built at DEBUG.  Default is DEBUG')
+parser.add_argument('--telemetry', action='store_true', default=False, help='Records per-turn phase timings, counts and end-of-turn RSS (resident memory, not a peak) to NAME.telemetry.jsonl.')
+parser.add_argument('--telemetry_every', type=int, nargs='?', default=10, help='Writes telemetry every N turns, as well as when its buffer fills and at exit (which a killed bot never reaches).  0 writes only then.  Default is 10')
+parser.add_argument('--record', action='store_true', default=False, help='Records every frame and the moves sent to NAME.hrec (see recording.py).')
+parser.add_argument('--plan_workers', type=int, nargs='?', default=0, help='Worker processes that each play the turn under one of --plan_variants; the best scoring plan is sent (see planner.py).  Default is 0, off')
+parser.add_argument('--plan_variants', type=json.loads, nargs='?', default='[{"hold_until": 5}, {"hold_until": 9}, {"enable_strategic_stilling": false}, {"enable_red_green": false}]', help='JSON list of option overrides, one per plan worker, used in order.  Fewer than --plan_workers is an error; extra ones are logged and left out.')
+parser.add_argument('--seed', type=int, nargs='?', default=None, help='Seed for breaking ties in the potential field.  Default is None, which breaks ties by cell index.')
 
 def assign_move(square):
-    available_moves = sorted((degrade_potential(*pf_map[neighbor]) \
-                                + 10000 * max(destinations[neighbor] + square.strength - 255, 0) \
-                                + (1e7 if mining_remains and neighbor in wall else 0),
-                                random.random(), direction, neighbor) for direction, neighbor in enumerate(game_map.neighbors(square))) # the random number breaks ties randomly
+    # squares are integer cell indices into game_map's flat owner/strength/production arrays
+    strength, production = strengths[square], productions[square]
+    available_moves = sorted((pf_map[neighbor] \
+                                + 10000 * max(destinations[neighbor] + strength - 255, 0) \
+                                + (1e7 if mining_remains and wall[neighbor] else 0),
+                                random.random(), direction, neighbor) for direction, neighbor in enumerate(game_map.cell_neighbors(square))) # the random number breaks ties randomly
     potential, _, best_d, target = available_moves.pop(0)
 
     if square in greenlight:
-        logging.debug(str(turn) + ' :: GREENlight:  ' + str(square) + ' went ' + str(best_d) + ', root ' + str(rootlookup[square]))
+        if verbose:
+            logging.debug(str(turn) + ' :: GREENlight:  ' + str(game_map.square(square)) + ' went ' + str(best_d) + ', root ' + str(game_map.square(trees.root[square])))
         return Move(square, best_d)
 
-    stay_loss = max(0, min(255, square.strength + square.production) + destinations[square] - 255)
+    stay_loss = max(0, min(255, strength + production) + destinations[square] - 255)
 
     if not stay_loss and (destinations[square] > 0 or square in redlight):     #safely meld with all oncoming
         return Move(square, STILL)
 
-    dangerous_empties = {neighbor : min(255, sum(n2.strength for n2 in game_map.neighbors(neighbor, include_self=True) if n2.owner not in (0, myID)))
-                            for neighbor in game_map.neighbors(square, n=2) \
-                            if (neighbor.owner == neighbor.strength == 0 or neighbor.owner not in (0,myID)) \
-                            and any(n2.owner not in (0, myID) and n2.strength > 0 for n2 in game_map.neighbors(neighbor, include_self=True)) \
-                            and any(destinations[n2] > 0 for n2 in game_map.neighbors(neighbor, include_self=True))}
+    dangerous_empties = combat.dangerous_nearby[square] > 0     # any dangerous empty within distance 2, see combat.py
+    dangerous = combat.dangerous
 
-    if args.enable_strategic_stilling \
+    if strategic_stilling \
         and not stay_loss \
         and not dangerous_empties \
-        and sum(1 for neighbor in game_map.neighbors(square) if neighbor.owner == neighbor.strength == 0) > 1 \
-        and len(set(n2 for neighbor in game_map.neighbors(square) if neighbor.owner == neighbor.strength == 0 for n2 in game_map.neighbors(neighbor) if n2.owner not in (0,myID) and n2.strength >= 3 * n2.production)) > 1:
+        and combat.strategic_still(square):
             return Move(square, STILL)   #strategic stilling ftw
 
-    if any(neighbor in dangerous_empties for neighbor in game_map.neighbors(target, include_self=True)) \
-        or (square.strength < args.hold_until * square.production and any(neighbor in dangerous_empties for neighbor in game_map.neighbors(square))):
-        _, _, best_d, target = min((degrade_potential(*pf_map[neighbor]) \
-                                + 10000 * max(destinations[neighbor] + square.strength - 255, 0) \
-                                + 5000  * (sum(dangerous_empties.get(n2,0) for n2 in game_map.neighbors(neighbor, include_self = True)) if destinations[neighbor] == 0 else 0) \
-                                + (1e7 if neighbor in wall else 0) \
-                                + (100000 if neighbor.owner == 0 and square.strength <= neighbor.strength else 0), random.random(), direction, neighbor)
-                                for direction, neighbor in enumerate(game_map.neighbors(square, include_self=True))) # the random number breaks ties randomly
+    if any(dangerous[neighbor] for neighbor in game_map.cell_neighbors(target, include_self=True) if neighbor != square) \
+        or (strength < args.hold_until * production and any(dangerous[neighbor] for neighbor in game_map.cell_neighbors(square))):
+        _, _, best_d, target = min((pf_map[neighbor] \
+                                + 10000 * max(destinations[neighbor] + strength - 255, 0) \
+                                + 5000  * (combat.exposure(neighbor, square) if destinations[neighbor] == 0 else 0) \
+                                + (1e7 if wall[neighbor] else 0) \
+                                + (100000 if owners[neighbor] == 0 and strength <= strengths[neighbor] else 0), random.random(), direction, neighbor)
+                                for direction, neighbor in enumerate(game_map.cell_neighbors(square, include_self=True))) # the random number breaks ties randomly
         return Move(square, best_d)
 
     if stay_loss or potential > 9000:  #ok, now figure out which is worse
-        if min(255, square.strength + square.production + destinations[square]) + min(255, destinations[target]) > min(255, destinations[square]) + min(255, destinations[target] + square.strength):
+        if min(255, strength + production + destinations[square]) + min(255, destinations[target]) > min(255, destinations[square]) + min(255, destinations[target] + strength):
             # agreeing to losing squares by staying, bc better off than moving
             return Move(square, STILL)
         else:
             return Move(square, best_d)
 
-    if target.owner != myID:  #an opponent -- actually can never be adjacent to opponent, it's always me or a "zero" owner square
-        if ((square.strength == 255) or (square.strength + destinations[target] > target.strength)) \
-            and square.strength >= 2 * square.production \
-            and (destinations[target] == 0 or square.strength >= args.hold_until * square.production):
+    if owners[target] != myID:  #an opponent -- actually can never be adjacent to opponent, it's always me or a "zero" owner square
+        if ((strength == 255) or (strength + destinations[target] > strengths[target])) \
+            and strength >= 2 * production \
+            and (destinations[target] == 0 or strength >= args.hold_until * production):
             return Move(square, best_d)
 
-    elif square.strength >= max(strength_hurdle, args.hold_until * square.production):   #target square is friendly, and we are strong enough to move
+    elif strength >= max(strength_hurdle, args.hold_until * production):   #target square is friendly, and we are strong enough to move
         return Move(square, best_d)
 
     return Move(square, STILL)
 
-def initial_potential(square):
-    # if empty, correlate with utility as an attacking square (if there are neighboring enemies)
-    if square.owner == square.strength == 0:
-        return sum(args.enemy_ROI for neighbor in game_map.neighbors(square) if neighbor.owner not in (0, myID))
-    elif square.production == 0 or square.owner not in (0,myID):
-        return float('inf')
-    elif square in wall:
-        return 100 * square.strength / square.production
-    else:
-        return square.strength / square.production
+def wants_to_move(square):
+    "Per direction, whether assign_move would move square that way if it were its best move, leaving out what depends on the squares assigned before it, for --move_solver batched."
+    if square in greenlight:
+        return (True,) * 4
+    if square in redlight:
+        return (False,) * 4
+    strength, production = strengths[square], productions[square]
+    friendly = strength >= max(strength_hurdle, args.hold_until * production)
+    border = strength >= 2 * production     # and it takes the square, which the solver checks (take)
+    return tuple(friendly if owners[target] == myID else border for target in game_map.cell_neighbors(square))
+
+def watch_cells(square):
+    "Per direction, the cells whose danger sends assign_move to its overkill dodge when that is square's best move, for --move_solver batched."
+    if square in greenlight or square in redlight:
+        return ((),) * 4
+    own = game_map.cell_neighbors(square) if strengths[square] < args.hold_until * productions[square] else ()
+    return [tuple(neighbor for neighbor in game_map.cell_neighbors(target, include_self=True) if neighbor != square) + own for target in game_map.cell_neighbors(square)]
 
-def degrade_potential(potential, distance):
-    return potential + args.potential_degradation_step * distance ** 2
+def init(my_id, new_game_map, options):
+    "Sets the bot up for a game on new_game_map, after get_init and before send_init.  options are parsed by parser."
+    global args, verbose, myID, game_map, combat_hold_until, owners, strengths, productions, features, combat, trees, field, solver, scheduler, telemetry, seen_enemies, turn, plans
+    args = options
+    if args.plan_workers > len(args.plan_variants):
+        raise ValueError('--plan_workers %d needs as many --plan_variants, got %d' % (args.plan_workers, len(args.plan_variants)))
+    if args.plan_workers and args.plan_workers < len(args.plan_variants):
+        logging.warning('--plan_workers %d:  not playing --plan_variants %s', args.plan_workers, json.dumps(args.plan_variants[args.plan_workers:]))
+    myID, game_map = my_id, new_game_map
+    combat_hold_until = args.hold_until
+    verbose = logging.getLogger().isEnabledFor(logging.DEBUG)     # skip building per-square log messages nobody will see
+    owners, strengths, productions = game_map.owners, game_map.strengths, game_map.productions
+    features = FeatureMaps(game_map, myID)
+    combat = CombatIndex(game_map, myID)
+    trees = RedGreenTrees(game_map, myID)
+    solver = MoveSolver(game_map, myID, rng=random)
+    field = potential_field.PotentialField(game_map, args.alpha, args.potential_degradation_step, neutral_only=True, seed=args.seed)
+    scheduler = TurnScheduler(args.turn_budget)
+    telemetry = Telemetry(args.name + '.telemetry.jsonl', enabled=args.telemetry, every=args.telemetry_every)
+    if args.record:
+        game_map.recorder = recording.Recorder(args.name + '.hrec', game_map, myID)
+    # warm up on the init frame, which is also turn 1's:  first-use costs stay out of the timed turns, and the scheduler starts with estimates
+    scheduler.start()
+    features.update()
+    scheduler.phase('features')
+    field.compute(myID, features.initial_potential(args.enemy_ROI, neutral_only=True))
+    scheduler.phase('field')
+    combat.update(features)
+    trees.build(field.degraded())
+    scheduler.phase('trees')
+    seen_enemies = set([0,myID])
+    turn = -1
+    plans = None
+    if args.plan_workers:
+        import planner     # multiprocessing takes ~40 ms to import, so only games with plan workers pay for it
+        plans = planner.PlanPool(game_map, args.plan_variants[:args.plan_workers], use_variant, play_turn)   # forked last, so the workers start from all of the above
 
-def walk_tree(d, level = 1):
-    for key, sub_d in d.items():
-        yield level, key
-        yield from walk_tree(sub_d, level + 1)
+def use_variant(variant):
+    "Runs once in each plan worker (see planner.py), switching its copy of the bot over to variant's options."
+    global combat_hold_until, plans
+    vars(args).update(variant)
+    combat_hold_until = args.hold_until
+    scheduler.margin *= 0.9     # finish a little early, leaving the bot time to score the plans
+    plans = None
 
-seen_enemies = set([0,myID])
-turn = -1
-while True:
-    game_map.get_frame()
-    start_time = time.time()
+def play_turn():
+    "Plays the frame game_map was just updated with, returning the direction of every square (see hlt.send_moves)."
+    global turn, wall, mining_remains, pf_map, redlight, greenlight, strategic_stilling, destinations, strength_hurdle
+    scheduler.start(game_map.received)
+    scheduler.phase('parse')
     turn += 1
+    if plans:
+        plans.submit(turn)
     moves = []
     #modify potential's such that wall-block gives bare scent if enemy is unseen ... what about
-    hero_empties = set(square for square in game_map if square.owner == square.strength == 0 and any(neighbor.owner == myID for neighbor in game_map.neighbors(square)))
+    features.update()
+    combat.update(features)
+    hero_empties = features.hero_empties   # per-cell 0/1 layers from here on, see features.py
     if not args.fixed_hold:
-        args.hold_until = combat_hold_until if hero_empties else 5
-    seen_enemies.update(game_map.neighbors(empty) for empty in hero_empties)    # THIS LINE HAS A MAJOR BUG AND DOESN'T DO WHAT IT'S SUPPOSED TO DO ... SEE WRITEUP
-    wall = set(square for square in game_map if square.owner == 0 and square.strength > 0 and any(neighbor.owner == myID for neighbor in game_map.neighbors(square)) and any(neighbor.owner not in seen_enemies or neighbor.owner == neighbor.strength == 0 for neighbor in game_map.neighbors(square)))
-    mining_remains = any(square for square in game_map if square.owner == 0 and square.production > 0 and square not in wall and any(neighbor.owner == myID for neighbor in game_map.neighbors(square)))
-    frontier = [(initial_potential(square), random.random(), initial_potential(square), 0, square) for square in game_map if square.owner != myID]
-    pf_map = dict()
-    heapq.heapify(frontier)
-    while len(pf_map) < game_map.width * game_map.height:
-        _, _, square_potential, friendly_distance, square = heapq.heappop(frontier)
-        if square not in pf_map:
-            pf_map[square] = (square_potential, friendly_distance)
-            for neighbor in game_map.neighbors(square):
-                if neighbor in wall:
-                    continue   #don't carve path through the wall, go around it
-                elif neighbor.owner != myID:
-                    neighbor_potential  = (1 - args.alpha) * square_potential + args.alpha * neighbor.strength / neighbor.production if neighbor.production and neighbor.owner == 0 else float('inf')
-                    heapq.heappush(frontier, (neighbor_potential, random.random(), neighbor_potential, friendly_distance, neighbor))
-                else:
-                    neighbor_potential  = degrade_potential(square_potential, friendly_distance + 1)
-                    heapq.heappush(frontier, (neighbor_potential, random.random(), square_potential, friendly_distance + 1, neighbor))
-
-    trees = defaultdict(dict)
-    edges = [(min((neighbor for neighbor in game_map.neighbors(square)), key=lambda x:degrade_potential(*pf_map[x])), square) for square in game_map if square.owner == myID]
-    # Given a list of edges [parent, child], generate trees ... adapted from https://gist.github.com/aethanyc/8313640
-    for parent, child in edges:
-        trees[parent][child] = trees[child]
-    parents, children = zip(*edges)
-    roots = set(parents).difference(children)
-    trees = {root: trees[root] for root in roots if root.owner == 0 and root.strength > 0}
-    rootlookup = {node:root for root, tree in trees.items() for _, node in walk_tree(tree)}
+        args.hold_until = combat_hold_until if 1 in hero_empties else 5
+    seen_enemies.update(game_map.cell_neighbors(empty) for empty in compress(range(game_map.size), hero_empties))    # THIS LINE HAS A MAJOR BUG AND DOESN'T DO WHAT IT'S SUPPOSED TO DO ... SEE WRITEUP
+    if args.heads_up_fight and len(game_map.alive) == 2:     # nobody left to keep the pact with
+        wall = bytes(game_map.size)
+    else:
+        wall = features.wall(seen_enemies)
+    mining_remains = features.mining_remains(wall)
+    initial = features.initial_potential(args.enemy_ROI, wall=wall)
+    scheduler.phase('features')
+    if args.incremental_pf:
+        field.repair(myID, initial, game_map.changed, wall)   #don't carve path through the wall, go around it
+    else:
+        field.compute(myID, initial, wall)
+    if args.layer_weights:
+        field.stack(myID, *features.source_layers(wall=wall))
+        pf_map = field.combine(args.layer_weights)
+    else:
+        pf_map = field.degraded()
+    scheduler.phase('field')
+
+    trees.build(pf_map)
 
     # create redlight and greenlight lists, which are "must still" and "must go" lists; some squares go in neither and are free to choose
     # for each tree, redlight the trunk that can't make it happen yet; greenlight the leaves that are ready to go
-    redlight = set()
-    greenlight = set()
-    if args.enable_red_green:
-        for root, tree in trees.items():
-            accum_production = accum_strength = 0
-            for distance, level in groupby(sorted(walk_tree(tree)), key = lambda x: x[0]):
-                squares = list(list(zip(*level))[1])
-                level_strength = sum(square.strength for square in squares)
-                level_production = sum(square.production for square in squares)
-                if accum_strength + accum_production > root.strength:   # accumulation is big enough, don't need to greenlight next square
-                    break
-                elif level_strength + accum_strength + accum_production > root.strength:
-                    #remove unneeded squares from last layer
-                    squares.sort(key = lambda x: x.strength, reverse=True)
-                    while level_strength + accum_strength + accum_production - squares[-1].strength > root.strength:
-                        level_strength -= squares.pop().strength
-                    greenlight.update(squares)
-                    break
-                else:
-                    accum_strength += level_strength + accum_production
-                    accum_production += level_production
-                    redlight.update(squares)
+    if args.enable_red_green and scheduler.allow('red_green', 'trees', 'assign'):
+        redlight, greenlight = trees.lights()
+    else:
+        redlight, greenlight = set(), set()
+    scheduler.phase('trees')
+    strategic_stilling = args.enable_strategic_stilling and scheduler.allow('strategic_stilling', 'assign')
 
     moves = set()
+    directions = game_map.blank_moves()
     destinations = defaultdict(int)
     originations = defaultdict(list)
-    interior_strengths = [square.strength for square in game_map if square.owner == myID and min(game_map.neighbors(square), key=lambda x: degrade_potential(*pf_map[x])).owner == myID]
+    interior_strengths = [strengths[square] for square in range(game_map.size) if owners[square] == myID and owners[trees.parent[square]] == myID]
     interior_strengths.sort(reverse=True)
     percentile = (1 - len(interior_strengths) / (50 * 50)) * (args.int_max - args.int_min) + args.int_min
     strength_hurdle = interior_strengths[int(len(interior_strengths) * percentile)] if interior_strengths else 0
-    for square in sorted((square for square in game_map if square.owner == myID and square.strength > 0), key=lambda x: (x.strength, -pf_map[x][1]), reverse=True):  #when tied strength, move closest first
-        move = assign_move(square)
-        moves.add(move)
-        target = game_map.get_target(square, move.direction)
-        destinations[target] += square.strength + (square.production if move.direction == STILL else 0)
-        originations[target].append((hlt.opposite_cardinal(move.direction), square))
-    hlt.send_frame(moves)
-    logging.debug(str(turn) + ' :: ' + str(int(1000 * (time.time() - start_time))))
+    deadline = scheduler.deadline()
+    squares = sorted((square for square in range(game_map.size) if owners[square] == myID and strengths[square] > 0), key=lambda x: (strengths[x], -field.distance[x]), reverse=True)  #when tied strength, move closest first
+    if args.move_solver == 'batched':
+        moving = {square: wants_to_move(square) for square in squares}
+        take = {square: square not in greenlight for square in squares}
+        follow = {square: square in greenlight or strengths[square] >= args.hold_until * productions[square] for square in squares}
+        meld = {square: square not in greenlight for square in squares}
+        hold = {square: strategic_stilling and square not in greenlight and combat.strategic_still(square) for square in squares}
+        watch = {square: watch_cells(square) for square in squares}
+        solver.solve(squares, solver.rows(squares, pf_map, wall if mining_remains else None), directions, deadline, moving, still_production=True, take=take, follow=follow,
+                     meld=meld, combat=combat, hold=hold, watch=watch, fight_rows=solver.rows(squares, pf_map, wall, blocked=True))
+    else:
+        for square in squares:
+            if time.monotonic() > deadline:    # out of time:  the weaker squares left over just stay STILL
+                scheduler.degrade('partial_moves')
+                break
+            move = assign_move(square)
+            moves.add(move)
+            directions[square] = move.direction
+            target = game_map.cell_target(square, move.direction)
+            combat.commit(target)
+            destinations[target] += strengths[square] + (productions[square] if move.direction == STILL else 0)
+            originations[target].append((hlt.opposite_cardinal(move.direction), square))
+    scheduler.phase('assign')
+    if plans:
+        directions, variant = plans.best(myID, directions, deadline)
+        if variant and verbose:
+            logging.debug('%d :: sent the plan for %s', turn, json.dumps(variant))
+        scheduler.phase('plans')
+    return directions
+
+def end_turn(directions):
+    "Per-turn bookkeeping once the moves have been sent."
+    scheduler.phase('send')
+    if scheduler.degraded:
+        logging.debug('%d :: degraded %s', turn, ', '.join(scheduler.degraded))
+    logging.debug('%d :: %d', turn, 1000 * scheduler.elapsed())
+    if telemetry.enabled:
+        squares = game_map.size - directions.count(hlt.NO_MOVE)
+        telemetry.end_turn(turn, scheduler.durations, squares=squares, moved=squares - directions.count(STILL), pushes=field.pushes, marked_dangerous=combat.marked, degraded=len(scheduler.degraded),
+                           plan_sent=0 if plans is None or plans.sent is None else plans.sent + 1)
+
+def main():
+    options = parser.parse_args()
+    logging.basicConfig(filename=options.name+'.log', level=getattr(logging, options.log_level.upper()), format='%(asctime)s - %(levelname)s - %(message)s')
+    logging.debug(str(options))
+    init(*hlt.get_init(arrays=True), options)
+    hlt.send_init(args.name)
+    while True:
+        game_map.get_frame()
+        directions = play_turn()
+        hlt.send_moves(game_map, directions)
+        end_turn(directions)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+Whole-map feature layers for the erdman bots, rebuilt once per turn.
+
+Every layer is a bytes object indexed by cell (y * width + x, as in hlt.GameMap) holding 0/1 flags or small counts,
+so bots query a layer with layer[cell].  Layers are built without a Python-level loop over the cells:  flags come from
+bytes.translate on the owner/strength arrays, rolling a layer one step across the torus is a single itemgetter
+gather over a column of GameMap.adjacency, and and/or/sums of layers are done on the layers read as big integers
+(one byte per cell, and no byte ever exceeds 4, so nothing carries into the next cell).
+"""
+
+from itertools import compress
+from operator import getitem, itemgetter, mul
+
+INF = float('inf')
+
+
+def flags(values, selected):
+    "0/1 layer, 1 where the byte values[cell] is in selected."
+    return bytes(values).translate(bytes(int(value in selected) for value in range(256)))
+
+
+class FeatureMaps:
+    "Per-turn feature layers of one GameMap, from the point of view of player my_id.  Call update() after every get_frame()."
+
+    def __init__(self, game_map, my_id):
+        self.game_map = game_map
+        self.my_id = my_id
+        self.size = size = game_map.size
+        self._rolls = [itemgetter(*game_map.adjacency[direction::5]) for direction in range(4)]   # layer -> neighbor in direction, per cell
+        self._ones = int.from_bytes(b'\x01' * size, 'big')
+        self.producing = flags(game_map.productions, set(range(1, 256)))
+        self._ratios = game_map.strength_table(lambda strength, production: strength / production if production else INF)
+        self._wall_ratios = game_map.strength_table(lambda strength, production: 100 * strength / production if production else INF)
+        self.update()
+
+    def _int(self, layer):
+        return int.from_bytes(layer, 'big')
+
+    def _layer(self, value):
+        return value.to_bytes(self.size, 'big')
+
+    def roll(self, layer, direction):
+        "The layer shifted so that each cell holds the value of its neighbor in the given direction."
+        return bytes(self._rolls[direction](layer))
+
+    def adjacent_count(self, layer):
+        "Per cell, the sum of a 0/1 layer over the four cardinal neighbors."
+        return self._layer(sum(self._int(self.roll(layer, direction)) for direction in range(4)))
+
+    def adjacent_any(self, layer):
+        "Per cell, 1 if any of the four cardinal neighbors is flagged in a 0/1 layer."
+        rolled = [self._int(self.roll(layer, direction)) for direction in range(4)]
+        return self._layer(rolled[0] | rolled[1] | rolled[2] | rolled[3])
+
+    def update(self):
+        "Recomputes the ownership layers from the game_map's current frame."
+        game_map, ones = self.game_map, self._ones
+        mine = flags(game_map.owners, {self.my_id})
+        neutral = flags(game_map.owners, {0})
+        mine_int, neutral_int = self._int(mine), self._int(neutral)
+        self.zero_strength = flags(game_map.strengths, {0})
+        self.mine, self.neutral = mine, neutral
+        self.enemy = self._layer(ones ^ mine_int ^ neutral_int)
+        self.empty = self._layer(neutral_int & self._int(self.zero_strength))                # owner == strength == 0
+        self.mine_adjacent = self.adjacent_any(mine)
+        self.enemy_count = self.adjacent_count(self.enemy)
+        self.hero_empties = self._layer(self._int(self.empty) & self._int(self.mine_adjacent))   # empties bordering my territory
+
+    def wall(self, seen_enemies):
+        "v26's wall:  neutral, non-zero strength squares of my border that also touch an empty square or an owner not in seen_enemies."
+        unseen = flags(self.game_map.owners, set(range(256)).difference(seen_enemies))
+        touches = self._int(self.adjacent_any(self._layer(self._int(unseen) | self._int(self.empty))))
+        strong = self._ones ^ self._int(self.zero_strength)
+        return self._layer(self._int(self.neutral) & strong & self._int(self.mine_adjacent) & touches)
+
+    def mining_remains(self, wall):
+        "True if any producing neutral square off the wall borders my territory."
+        return bool(self._int(self.neutral) & self._int(self.producing) & (self._ones ^ self._int(wall)) & self._int(self.mine_adjacent))
+
+    def initial_potential(self, enemy_ROI, neutral_only=True, wall=None):
+        """
+        initial_potential of every cell:  empties score enemy_ROI per adjacent enemy; otherwise strength / production, or
+        inf without production (and, with neutral_only, on enemy squares); wall squares score 100 times strength / production.
+        Friendly cells get values too, which the potential field ignores.
+        """
+        strengths = self.game_map.strengths
+        cells = range(self.size)
+        potential = list(map(getitem, self._ratios, strengths))     # inf without production
+        if wall is not None:
+            wall_ratios = self._wall_ratios
+            for cell in compress(cells, wall):
+                potential[cell] = wall_ratios[cell][strengths[cell]]
+        if neutral_only:
+            for cell in compress(cells, self.enemy):
+                potential[cell] = INF
+        roi = [sum(enemy_ROI for _ in range(count)) for count in range(5)]   # summed the way the bots always have, for identical floats
+        enemy_count = self.enemy_count
+        for cell in compress(cells, self.empty):
+            potential[cell] = roi[enemy_count[cell]]
+        return potential
+
+    def source_layers(self, neutral_only=True, wall=None):
+        """
+        (mining, combat):  initial_potential split in two for PotentialField.stack().  mining is initial_potential with
+        empties scoring 0; combat is the adjacent enemy count of every empty, 0 elsewhere.  initial_potential(enemy_ROI)
+        is mining + enemy_ROI * combat.
+        """
+        potential = self.initial_potential(0, neutral_only, wall)
+        return potential, bytes(map(mul, self.empty, self.enemy_count))
@@ -8,8 +8,10 @@ communicating with the Halite game environment.
 """
 
 import sys
+import time
+from array import array
 from collections import namedtuple
-from itertools import chain, zip_longest
+from itertools import chain, compress, zip_longest
 
 
 def grouper(iterable, n, fillvalue=None):
@@ -24,6 +26,7 @@ def grouper(iterable, n, fillvalue=None):
 # the send_frame function when communicating with the Halite game environment.
 
 NORTH, EAST, SOUTH, WEST, STILL = range(5)
+NO_MOVE = 5     # entry of a send_moves direction array for a square that isn't moved at all
 
 def opposite_cardinal(direction):
     "Returns the opposing cardinal direction."
@@ -36,58 +39,262 @@ Square = namedtuple('Square', 'x y owner strength production')
 Move = namedtuple('Move', 'square direction')
 
 
+# The tables depend only on the map size and are never modified, so every GameMap of a size shares one set:  the
+# simulator and benchmark build many maps per process, and bot_server.py builds them before forking game processes.
+_TABLE_NAMES = ('adjacency', 'vicinity', 'adjacent_self', 'adjacent', 'nearby_self', 'nearby', '_neighbor_rows', '_xs', '_ys', '_wrap_x', '_wrap_y', '_move_tokens')
+_tables = {}
+
+
 class GameMap:
-    def __init__(self, size_string, production_string, map_string=None):
+    def __init__(self, size_string, production_string, map_string=None, arrays=False):
+        "With arrays=True, owner/strength/production live only in flat arrays indexed by y * width + x, and Squares are built on demand."
         self.width, self.height = tuple(map(int, size_string.split()))
+        self.size = self.width * self.height
+        self.arrays = arrays
         self.production = tuple(tuple(map(int, substring)) for substring in grouper(production_string.split(), self.width))
+        self.productions = array('B', chain.from_iterable(self.production))
+        self.owners = array('B', bytes(self.size))
+        self.strengths = array('B', bytes(self.size))
+        self._next_owners = array('B', bytes(self.size))     # decode buffers, preallocated once and reused every frame
+        self._next_strengths = array('B', bytes(self.size))
+        self.changed = None
         self.contents = None
+        self.recorder = None    # a recording.Recorder, which send_moves hands every turn to
+        # per-player statistics, indexed by owner (0 is neutral) and kept up to date by every frame, see _update_statistics
+        self.square_counts = array('i', bytes(4 * 256))
+        self.strength_totals = array('i', bytes(4 * 256))
+        self.production_totals = array('i', bytes(4 * 256))
+        self.border_counts = array('i', bytes(4 * 256))        # squares with a cardinal neighbor of another owner
+        self.alive = set()                                     # players other than 0 with at least one square
+        self.square_counts[0], self.production_totals[0] = self.size, sum(self.productions)   # the blank map before the first frame
+        self._border = bytearray(self.size)
+        self._masks = {0: bytearray([1]) * self.size}          # player -> 0/1 per cell, for the players with squares
+        self._territories = {}                                 # player -> connectivity(player), until that player's squares change
+        self._build_tables()
         self.get_frame(map_string)
-        self.starting_player_count = len(set(square.owner for square in self)) - 1
+        self.starting_player_count = len(self.alive)
+
+    def _build_tables(self):
+        "Precomputes the toroidal neighborhood index once per map size, so neighbor lookups become table reads."
+        tables = _tables.get((self.width, self.height))
+        if tables is not None:
+            self.__dict__.update(tables)
+            return
+        width, height = self.width, self.height
+        radius1 = ((0, -1), (1, 0), (0, 1), (-1, 0), (0, 0))   # NORTH, EAST, SOUTH, WEST, STILL
+        radius2 = tuple((dx, dy) for dy in range(-2, 3) for dx in range(-2, 3) if abs(dx) + abs(dy) <= 2)   # same order as neighbors(square, n=2, include_self=True)
+        # flat tables: cell * 5 + direction, and cell * 13 + k for the radius-2 diamond
+        self.adjacency = array('i', (((y + dy) % height) * width + (x + dx) % width for y in range(height) for x in range(width) for dx, dy in radius1))
+        self.vicinity = array('i', (((y + dy) % height) * width + (x + dx) % width for y in range(height) for x in range(width) for dx, dy in radius2))
+        # the same tables as per-cell tuples, which is what Python-level loops want to iterate over
+        self.adjacent_self = [tuple(self.adjacency[5 * cell:5 * cell + 5]) for cell in range(self.size)]
+        self.adjacent = [row[:4] for row in self.adjacent_self]
+        self.nearby_self = [tuple(self.vicinity[13 * cell:13 * cell + 13]) for cell in range(self.size)]
+        self.nearby = [row[:6] + row[7:] for row in self.nearby_self]
+        self._neighbor_rows = {(1, False): self.adjacent, (1, True): self.adjacent_self, (2, False): self.nearby, (2, True): self.nearby_self}
+        self._xs = array('i', (cell % width for cell in range(self.size)))
+        self._ys = array('i', (cell // width for cell in range(self.size)))
+        self._wrap_x = array('i', (min(dx, width - dx) for dx in range(width)))
+        self._wrap_y = array('i', (min(dy, height - dy) for dy in range(height)))
+        # b"x y d " for every cell and direction, as sent to the environment, for send_moves
+        self._move_tokens = [b'%d %d %d ' % (x, y, translate_cardinal(direction)) for y in range(height) for x in range(width) for direction in range(5)]
+        _tables[width, height] = {name: getattr(self, name) for name in _TABLE_NAMES}
 
     def get_frame(self, map_string=None):
-        "Updates the map information from the latest frame provided by the Halite game environment."
+        "Updates the map information from the latest frame provided by the Halite game environment.  Afterwards, self.changed lists the indices of the cells whose owner or strength differ from the previous frame."
         if map_string is None:
-            map_string = get_string()
-        split_string = map_string.split()
-        owners = list()
-        while len(owners) < self.width * self.height:
-            counter = int(split_string.pop(0))
-            owner = int(split_string.pop(0))
-            owners.extend([owner] * counter)
-        assert len(owners) == self.width * self.height
-        assert len(split_string) == self.width * self.height
-        self.contents = [[Square(x, y, owner, strength, production)
-                          for x, (owner, strength, production)
-                          in enumerate(zip(owner_row, strength_row, production_row))]
-                         for y, (owner_row, strength_row, production_row)
-                         in enumerate(zip(grouper(owners, self.width),
-                                          grouper(map(int, split_string), self.width),
-                                          self.production))]
+            map_string = sys.stdin.buffer.readline()
+        self.received = time.monotonic()    # when the frame arrived, for bots that keep a per-turn deadline
+        self._decode(map_string.split())
+
+    def _decode(self, tokens):
+        "Single pass over the frame tokens: owner runs, then strengths, written into the decode buffers and diffed against the current arrays."
+        values = list(map(int, tokens))
+        size = self.size
+        owners, strengths = memoryview(self._next_owners), memoryview(self._next_strengths)
+        position = index = 0
+        while position < size:
+            counter, owner = values[index], values[index + 1]
+            owners[position:position + counter] = bytes((owner,)) * counter
+            position += counter
+            index += 2
+        assert position == size
+        assert len(values) - index == size
+        strengths[:] = bytes(values[index:])
+        self._swap()
+
+    def set_frame(self, owners, strengths, received=None):
+        "Updates the map from owner and strength bytes decoded elsewhere (e.g. by another process, through shared memory), with the same bookkeeping as get_frame."
+        self.received = time.monotonic() if received is None else received
+        memoryview(self._next_owners)[:] = owners
+        memoryview(self._next_strengths)[:] = strengths
+        self._swap()
+
+    def _swap(self):
+        "Diffs the decode buffers against the current arrays into self.changed, then makes them current."
+        size, width = self.size, self.width
+        owners, strengths = memoryview(self._next_owners), memoryview(self._next_strengths)
+        if self.changed is not None:
+            old_owners, old_strengths = memoryview(self.owners), memoryview(self.strengths)
+            self.changed = [cell for start in range(0, size, width)
+                            if owners[start:start + width] != old_owners[start:start + width] or strengths[start:start + width] != old_strengths[start:start + width]
+                            for cell in range(start, start + width)
+                            if owners[cell] != old_owners[cell] or strengths[cell] != old_strengths[cell]]
+        else:
+            self.changed = range(size)
+        self._update_statistics()
+        self.owners[:] = self._next_owners
+        self.strengths[:] = self._next_strengths
+        if not self.arrays:
+            self.contents = [[Square(x, y, owner, strength, production)
+                              for x, (owner, strength, production)
+                              in enumerate(zip(owner_row, strength_row, production_row))]
+                             for y, (owner_row, strength_row, production_row)
+                             in enumerate(zip(grouper(self.owners, self.width),
+                                              grouper(self.strengths, self.width),
+                                              self.production))]
+
+    def _update_statistics(self):
+        """
+        Brings the per-player statistics up to date, between the diff and the swap (old values still in
+        self.owners/strengths, new ones in the decode buffers).  Only the cells that changed owner and their neighbors
+        are visited in Python; strength totals are summed in C over each live player's square mask.
+        """
+        size, width = self.size, self.width
+        owners, old_owners = memoryview(self._next_owners), memoryview(self.owners)
+        conquered = [cell for start in range(0, size, width) if owners[start:start + width] != old_owners[start:start + width]
+                     for cell in range(start, start + width) if owners[cell] != old_owners[cell]]
+        masks = self._masks
+        if conquered:
+            square_counts, production_totals, border_counts, border, adjacent_self = self.square_counts, self.production_totals, self.border_counts, self._border, self.adjacent_self
+            productions = self.productions
+            touched = set()
+            for cell in conquered:
+                owner, old_owner = owners[cell], old_owners[cell]
+                square_counts[owner] += 1
+                square_counts[old_owner] -= 1
+                production_totals[owner] += productions[cell]
+                production_totals[old_owner] -= productions[cell]
+                if owner not in masks:
+                    masks[owner] = bytearray(size)
+                masks[owner][cell], masks[old_owner][cell] = 1, 0
+                touched.add(owner)
+                touched.add(old_owner)
+            for cell in set(chain.from_iterable(adjacent_self[cell] for cell in conquered)):
+                owner, neighbors = owners[cell], adjacent_self[cell]
+                border_counts[old_owners[cell]] -= border[cell]
+                border[cell] = owners[neighbors[0]] != owner or owners[neighbors[1]] != owner or owners[neighbors[2]] != owner or owners[neighbors[3]] != owner
+                border_counts[owner] += border[cell]
+            for player in touched:
+                self._territories.pop(player, None)
+                if not square_counts[player]:
+                    del masks[player]
+                    self.strength_totals[player] = 0
+                if player:
+                    if square_counts[player]:
+                        self.alive.add(player)
+                    else:
+                        self.alive.discard(player)
+        strengths = self._next_strengths
+        for player, mask in masks.items():
+            self.strength_totals[player] = sum(compress(strengths, mask))
+
+    def connectivity(self, player):
+        """
+        Sizes of player's separate territories (4-connected, across the map edges), largest first.  Computed on first
+        use and cached until player gains or loses a square, so asking every turn only costs when the territory changed.
+        """
+        territories = self._territories.get(player)
+        if territories is None:
+            owners, adjacent = self.owners, self.adjacent
+            unvisited = set(compress(range(self.size), map(player.__eq__, owners)))
+            territories = []
+            while unvisited:
+                stack = [unvisited.pop()]
+                count = 0
+                while stack:
+                    cell = stack.pop()
+                    count += 1
+                    for neighbor in adjacent[cell]:
+                        if neighbor in unvisited:
+                            unvisited.remove(neighbor)
+                            stack.append(neighbor)
+                territories.append(count)
+            territories = self._territories[player] = tuple(sorted(territories, reverse=True))
+        return territories
 
     def __iter__(self):
         "Allows direct iteration over all squares in the GameMap instance."
+        if self.arrays:
+            return map(self.square, range(self.size))
         return chain.from_iterable(self.contents)
 
+    def strength_table(self, function):
+        """
+        Per cell, the tuple of function(strength, production) for every strength 0-255.  Production never changes, so
+        bots build these at init and replace per-turn arithmetic on strength and production with table[cell][strength].
+        The rows are computed once per distinct production value and shared between cells.
+        """
+        rows = {production: tuple(function(strength, production) for strength in range(256)) for production in set(self.productions)}
+        return [rows[production] for production in self.productions]
+
+    def blank_moves(self):
+        "A direction array for send_moves with no moves in it:  one byte per cell, all NO_MOVE."
+        return bytearray([NO_MOVE]) * self.size
+
+    def square(self, index):
+        "Returns the Square at a given cell index.  In arrays mode, the Square is built on demand from the flat arrays."
+        y, x = divmod(index, self.width)
+        if self.contents is not None:
+            return self.contents[y][x]
+        return Square(x, y, self.owners[index], self.strengths[index], self.productions[index])
+
+    def index(self, square):
+        "Returns the cell index of a given square."
+        return square.y * self.width + square.x
+
     def neighbors(self, square, n=1, include_self=False):
         "Iterable over the n-distance neighbors of a given square.  For single-step neighbors, the enumeration index provides the direction associated with the neighbor."
+        return map(self.square, self.cell_neighbors(self.index(square), n, include_self))
+
+    def cell_neighbors(self, index, n=1, include_self=False):
+        "Same as neighbors, but takes and returns cell indices instead of Squares.  For n <= 2 this is a precomputed tuple."
         assert isinstance(include_self, bool)
         assert isinstance(n, int) and n > 0
-        if n == 1:
-            combos = ((0, -1), (1, 0), (0, 1), (-1, 0), (0, 0))   # NORTH, EAST, SOUTH, WEST, STILL ... matches indices provided by enumerate(game_map.neighbors(square))
-        else:
-            combos = ((dx, dy) for dy in range(-n, n+1) for dx in range(-n, n+1) if abs(dx) + abs(dy) <= n)
-        return (self.contents[(square.y + dy) % self.height][(square.x + dx) % self.width] for dx, dy in combos if include_self or dx or dy)
+        if n <= 2:
+            return self._neighbor_rows[n, include_self][index]
+        combos = ((dx, dy) for dy in range(-n, n+1) for dx in range(-n, n+1) if abs(dx) + abs(dy) <= n)
+        y, x = divmod(index, self.width)
+        return tuple(((y + dy) % self.height) * self.width + (x + dx) % self.width for dx, dy in combos if include_self or dx or dy)
 
     def get_target(self, square, direction):
         "Returns a single, one-step neighbor in a given direction."
-        dx, dy = ((0, -1), (1, 0), (0, 1), (-1, 0), (0, 0))[direction]
-        return self.contents[(square.y + dy) % self.height][(square.x + dx) % self.width]
+        return self.square(self.adjacency[5 * (square.y * self.width + square.x) + direction])
+
+    def cell_target(self, index, direction):
+        "Same as get_target, but takes and returns cell indices."
+        return self.adjacency[5 * index + direction]
+
+    def get_targets(self, cells, directions):
+        "Batched cell_target:  the targets of many cells at once, given one direction per cell or a single direction for all of them."
+        adjacency = self.adjacency
+        if isinstance(directions, int):
+            return [adjacency[5 * cell + directions] for cell in cells]
+        return [adjacency[5 * cell + direction] for cell, direction in zip(cells, directions)]
 
     def get_distance(self, sq1, sq2):
         "Returns Manhattan distance between two squares."
-        dx = min(abs(sq1.x - sq2.x), sq1.x + self.width - sq2.x, sq2.x + self.width - sq1.x)
-        dy = min(abs(sq1.y - sq2.y), sq1.y + self.height - sq2.y, sq2.y + self.height - sq1.y)
-        return dx + dy
+        return self._wrap_x[(sq1.x - sq2.x) % self.width] + self._wrap_y[(sq1.y - sq2.y) % self.height]
+
+    def cell_distance(self, index1, index2):
+        "Same as get_distance, but takes cell indices."
+        return self._wrap_x[(self._xs[index1] - self._xs[index2]) % self.width] + self._wrap_y[(self._ys[index1] - self._ys[index2]) % self.height]
+
+    def get_distances(self, index, cells):
+        "Batched cell_distance:  the distances from one cell index to each of many cell indices."
+        xs, ys, wrap_x, wrap_y, width, height = self._xs, self._ys, self._wrap_x, self._wrap_y, self.width, self.height
+        x, y = xs[index], ys[index]
+        return [wrap_x[(x - xs[cell]) % width] + wrap_y[(y - ys[cell]) % height] for cell in cells]
 
 #####################################################################################################################
 # Functions for communicating with the Halite game environment (formerly contained in separate module networking.py #
@@ -101,12 +308,12 @@ def send_string(s):
 
 
 def get_string():
-    return sys.stdin.readline().rstrip('\n')
+    return sys.stdin.buffer.readline().decode().rstrip('\n')   # always read through the binary buffer, which get_frame uses directly
 
 
-def get_init():
+def get_init(arrays=False):
     playerID = int(get_string())
-    m = GameMap(get_string(), get_string())
+    m = GameMap(get_string(), get_string(), arrays=arrays)
     return playerID, m
 
 
@@ -127,3 +334,20 @@ def translate_cardinal(direction):
 
 def send_frame(moves):
     send_string(' '.join(str(move.square.x) + ' ' + str(move.square.y) + ' ' + str(translate_cardinal(move.direction)) for move in moves))
+
+
+_SENT = (bytes(int(direction < STILL) for direction in range(256)), bytes(int(direction <= STILL) for direction in range(256)))
+
+def send_moves(game_map, directions, omit_still=True):
+    """
+    Sends a turn's moves with a single write to stdout.  directions holds one direction per cell (see
+    GameMap.blank_moves), NO_MOVE for squares without a move.  With omit_still, STILL moves are left out as well,
+    since the environment treats squares without a move as STILL anyway.  If game_map.recorder is set, the frame and
+    the moves are recorded first, so the record is on disk even if the environment kills the bot right after the send.
+    """
+    if game_map.recorder is not None:
+        game_map.recorder.record(game_map, directions)
+    tokens = game_map._move_tokens
+    cells = compress(range(game_map.size), bytes(directions).translate(_SENT[not omit_still]))
+    sys.stdout.buffer.write(b''.join([tokens[5 * cell + directions[cell]] for cell in cells]) + b'\n')
+    sys.stdout.flush()
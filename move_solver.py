@@ -0,0 +1,192 @@
+"""
+Batched move assignment:  a whole turn's moves solved as one problem, instead of square by square.
+
+The greedy loops in erdman_v17/v26 assign squares strongest first, each one against the destinations of the squares
+assigned before it.  A square can lose its best target to a square placed earlier even when the reverse would waste
+less, and every square rebuilds and sorts its options.  Here each square gets a row of five costs (NORTH, EAST,
+SOUTH, WEST, STILL), built a direction at a time for all squares at once from the columns of
+game_map.adjacency.  The 255 cap becomes a shared cost of CAP_COST per unit of strength over 255 landing on a cell.
+
+Then, in rounds, squares bid strongest first for whichever option is cheapest given everyone else's current choice,
+following the greedy loops' rules with "assigned before it" read as "stronger":
+- a square's best move is the direction cheapest by its row and the cap.  It takes it if it is one of its moving
+  directions, and stays otherwise:  staying costs STAY_COST more than the best move, or STAY_COST less if the square
+  doesn't want it, and other directions cost MOVE_COST more unless they are moving directions.
+- a square in take only moves onto a cell it doesn't own if it takes it, at 255 or together with the stronger squares
+  moving onto it, and a square not in follow doesn't move onto such a cell after a stronger square.
+- if staying or the best move would lose strength to the cap, the square does whichever keeps more, counting the
+  production it gives up by moving, instead.
+- a square in meld that a stronger square is moving onto pays MELD_COST to move off, unless staying loses strength
+  to the cap, so it stays and merges.
+- with a CombatIndex, a combat cell is dangerous to a square once a stronger square's target is on or next to it.
+  A square with a dangerous cell among the watch cells of its best move weighs its fight row instead of its row, plus
+  DANGER_COST per unit of enemy strength on the dangerous cells on or next to each target no stronger square is
+  moving onto:  the overkill dodge.  A square in hold pays MELD_COST like a square in meld, while no cell within
+  distance 2 is dangerous.
+The first round only charges the cap for the stronger squares' strength, so it plays the greedy loop's moves:  the
+weaker squares make way.  Later rounds charge it for everyone's, so stronger squares can make room for weaker ones where
+that wastes less.  After the second round, only the squares next to a switch bid again.  A square only switches when
+that strictly lowers its cost.  The rounds stop when nobody switches, after `rounds` rounds, or at the deadline;
+each round leaves a complete plan.
+
+Fight rows, for the overkill dodge, also charge BLOCKED_COST for neutral squares the square can't take by itself.
+"""
+
+import random
+import time
+
+from hlt import STILL
+
+CAP_COST = 10000        # per unit of strength lost to the cap, the same weight the greedy loops use
+STAY_COST = 0.001       # a square stays exactly when its best move isn't one it wants
+MOVE_COST = 5000        # a square doesn't move a way it doesn't want
+BLOCKED_COST = 100000   # moving onto a neutral square it can't take by itself
+WALL_COST = 1e7
+DANGER_COST = 5000      # per unit of enemy strength a move exposes to overkill, the same weight v26's greedy loop uses
+MELD_COST = 5000        # moving off a cell a stronger square is moving onto
+
+
+class MoveSolver:
+    "Cost rows and best-response rounds for player my_id's squares.  See the module docstring."
+
+    def __init__(self, game_map, my_id, rounds=8, rng=random):
+        self.game_map = game_map
+        self.rng = rng      # for the tie breaks:  the bot's random, so a seeded bot replays exactly
+        self.my_id = my_id
+        self.rounds = rounds
+        self._neighbors = [game_map.adjacency[direction::5] for direction in range(4)]     # _neighbors[direction][cell]:  cell's neighbor that way
+        self.switches = 0   # option changes made by the rounds this turn
+
+    def rows(self, squares, pf_map, wall=None, blocked=False):
+        """
+        {square: [cost per option]}:  the pf of each neighbor, plus WALL_COST on the cells of wall (a per-cell 0/1 layer)
+        if given, and the pf of the square's own cell for STILL.  blocked adds BLOCKED_COST for neutral squares the
+        square can't take by itself, for fight rows.  Built one direction at a time for all the squares at once.
+        """
+        owners, strengths = self.game_map.owners, self.game_map.strengths
+        mine = list(map(strengths.__getitem__, squares))
+        columns = []
+        for neighbors in self._neighbors:
+            targets = list(map(neighbors.__getitem__, squares))
+            costs = list(map(pf_map.__getitem__, targets))
+            if blocked:
+                costs = [cost + BLOCKED_COST if owners[target] == 0 and strength <= strengths[target] else cost for cost, target, strength in zip(costs, targets, mine)]
+            if wall is not None:
+                costs = [cost + WALL_COST if wall[target] else cost for cost, target in zip(costs, targets)]
+            columns.append(costs)
+        columns.append(list(map(pf_map.__getitem__, squares)))
+        return dict(zip(squares, map(list, zip(*columns))))
+
+    def solve(self, squares, rows, directions, deadline, moving, still_production=False, take=None, follow=None, meld=None, combat=None, hold=None, watch=None, fight_rows=None):
+        """
+        Chooses a direction for each of squares (strongest first) from rows, and writes it into directions (see
+        hlt.send_moves).  moving[square] holds, per direction, whether square would move that way if it were its best
+        move.  A STILL square adds its production to its own cell as well (up to 255) if still_production.  take, follow
+        and meld hold the squares the rules of the same names apply to (see the module docstring).  combat, a
+        CombatIndex updated for the turn, turns on the overkill dodge:  watch[square] lists, per direction, the cells
+        whose danger puts square on fight_rows[square] when that is its best move, and hold[square] is true for squares
+        that stay while no cell within distance 2 is dangerous.  Returns {cell: strength landing on it}, like the greedy
+        loops' destinations.
+        """
+        game_map, my_id, rng = self.game_map, self.my_id, self.rng
+        owners, strengths, productions, adjacency, adjacent_self = game_map.owners, game_map.strengths, game_map.productions, game_map.adjacency, game_map.adjacent_self
+        amounts = {square: (strengths[square],) * 4 + (min(255, strengths[square] + productions[square]) if still_production else strengths[square],) for square in squares}
+        rank = {square: index for index, square in enumerate(squares)}
+        choice = {square: min(rng.sample(range(4), 4), key=rows[square].__getitem__) if any(moving[square]) else STILL for square in squares}
+        load, arrivals = {}, {}     # strength landing on each cell, and the squares it comes from
+        for square, direction in choice.items():
+            target = adjacency[5 * square + direction]
+            load[target] = load.get(target, 0) + amounts[square][direction]
+            arrivals.setdefault(target, set()).add(square)
+        if take is None:
+            take = dict.fromkeys(squares, False)
+        if follow is None:
+            follow = dict.fromkeys(squares, True)
+        if meld is None:
+            meld = dict.fromkeys(squares, False)
+        if hold is None:
+            hold = dict.fromkeys(squares, False)
+        touchers = {}   # squares whose target is on or next to each cell, for the combat squares
+        if combat is not None:
+            combat_cells, enemy_strength = combat.combat, combat.enemy_strength
+            contested = set(square for square in squares if any(combat_cells[cell] for cell in game_map.nearby_self[square]))
+            for square in contested:
+                for cell in adjacent_self[adjacency[5 * square + choice[square]]]:
+                    touchers.setdefault(cell, set()).add(square)
+        else:
+            contested = set()
+        stale = set()   # squares next to a switch, which bid again
+        self.switches = 0
+        for done in range(self.rounds):
+            switched = out_of_time = False
+            for square in squares:
+                if done > 1 and square not in stale and square not in contested:
+                    continue
+                if time.monotonic() > deadline:
+                    out_of_time = True
+                    break
+                stale.discard(square)
+                direction = choice[square]
+                target = adjacency[5 * square + direction]
+                amount, own_rank, row = amounts[square], rank[square], rows[square]
+                load[target] -= amount[direction]
+                arrivals[target].discard(square)
+                stronger = lambda group: any(rank[other] < own_rank for other in group)
+                ahead = lambda cell: sum(amounts[other][choice[other]] for other in arrivals.get(cell, ()) if rank[other] < own_rank)   # the stronger squares' strength landing on cell
+                cells = adjacency[5 * square:5 * square + 5]
+                caps = []
+                for option, cell in enumerate(cells):
+                    landing = load.get(cell, 0) if done else ahead(cell)     # the first round is a greedy pass:  the weaker squares make way
+                    caps.append(CAP_COST * (max(0, landing + amount[option] - 255) - max(0, landing - 255)))
+                best = min(rng.sample(range(4), 4), key=lambda option: row[option] + caps[option])     # the greedy loops' best move
+                fighting = holding = False
+                if square in contested:
+                    for cell in adjacent_self[target]:
+                        touchers[cell].discard(square)
+                    dangerous = set(cell for cell in touchers if combat_cells[cell] and stronger(touchers[cell]))
+                    fighting = not dangerous.isdisjoint(watch[square][best])
+                    holding = hold[square] and dangerous.isdisjoint(game_map.nearby[square])
+                else:
+                    holding = hold[square]
+                if fighting:
+                    costs = [cost + cap for cost, cap in zip(fight_rows[square], caps)]
+                    for option, cell in enumerate(cells):
+                        if not stronger(arrivals.get(cell, ())):
+                            costs[option] += DANGER_COST * sum(enemy_strength[neighbor] for neighbor in adjacent_self[cell] if neighbor != square and neighbor in dangerous)
+                elif caps[STILL] or caps[best]:
+                    # squeezed by the cap:  stay or take the best move, whichever keeps more strength, production included
+                    costs = [row[option] + caps[option] + CAP_COST * (amount[STILL] - amount[option]) for option in range(4)]
+                    costs.append(row[best] + caps[STILL] + STAY_COST)
+                else:
+                    costs = [cost + cap for cost, cap in zip(row[:4], caps)]
+                    for option, cell in enumerate(cells[:4]):
+                        if not moving[square][option]:
+                            costs[option] += MOVE_COST
+                        elif owners[cell] != my_id:
+                            landing = ahead(cell)
+                            if (landing and not follow[square]) or (take[square] and amount[option] < 255 and landing + amount[option] <= strengths[cell]):
+                                costs[option] += MOVE_COST
+                    costs.append(row[best] + (STAY_COST if costs[best] == row[best] else -STAY_COST))
+                if not caps[STILL] and (holding or (meld[square] and stronger(arrivals.get(square, ())))):
+                    for option in range(4):
+                        costs[option] += MELD_COST
+                option = min(rng.sample(range(5), 5), key=costs.__getitem__)
+                if costs[option] >= costs[direction]:
+                    option = direction      # ties keep the current choice
+                cell = cells[option]
+                load[cell] = load.get(cell, 0) + amount[option]
+                arrivals.setdefault(cell, set()).add(square)
+                if square in contested:
+                    for neighbor in adjacent_self[cell]:
+                        touchers.setdefault(neighbor, set()).add(square)
+                if option != direction:
+                    choice[square] = option
+                    switched = True
+                    self.switches += 1
+                    for changed in (target, cell):
+                        stale.update(other for other in adjacent_self[changed] if other in rank)
+            if out_of_time or (done and not switched):
+                break
+        for square, direction in choice.items():
+            directions[square] = direction
+        return load
@@ -0,0 +1,195 @@
+"""
+Candidate move plans from worker processes, so a bot can try other options on the cores it would leave idle.
+
+A PlanPool forks one worker per parameter variant once the bot is initialized, so every worker starts from the bot's
+warmed-up state and keeps its own copy of it from then on.  Each turn the bot writes the frame's owner and strength
+bytes into shared memory and wakes the workers.  A worker loads the frame into its GameMap, plays the turn under its
+variant's options and writes its direction array into its own slot of the shared memory.  Meanwhile the bot plays
+its own plan, then scores it and whichever worker plans have come in by the deadline with score_plan(), and sends the
+best.  A worker that falls behind skips straight to the newest frame; plans for earlier turns are ignored.
+
+The frames alternate between two slots, so a worker still reading one turn's frame is never overwritten by the next.
+Each slot starts with the turn it holds, set to -1 while the bot rewrites it.  A worker that has fallen two turns
+behind finds its slot retagged, before or after copying the frame out, and skips that frame instead of playing a mix
+of two turns; the newer turn's message is already on its way.
+Workers are forked, so this needs a platform with fork (Linux, like the match machines).
+"""
+
+import atexit
+import json
+import logging
+import os
+import struct
+import time
+from collections import Counter
+from itertools import chain, compress
+from multiprocessing import get_context, shared_memory
+from multiprocessing.connection import wait
+
+from hlt import STILL, NO_MOVE
+
+TAG = struct.Struct('<q')     # the turn a frame slot holds, -1 while it's being written
+
+
+def score_plan(game_map, my_id, directions, capture_weight=10):
+    """
+    One-step outcome of a plan (a send_moves direction array) on game_map's frame, with the enemies assumed to hold
+    still:  capture_weight times the production of the neutral squares it takes, less the strength it loses to the
+    255 cap and the strength it exposes to enemy attacks (overkill).  Returns (score, captured, cap_loss, exposure).
+    """
+    owners, strengths, productions = game_map.owners, game_map.strengths, game_map.productions
+    adjacency, adjacent_self = game_map.adjacency, game_map.adjacent_self
+    incoming = {}
+    for cell in compress(range(game_map.size), map(my_id.__eq__, owners)):
+        direction = directions[cell]
+        if direction == NO_MOVE:
+            direction = STILL       # squares without a move stay where they are
+        target = adjacency[5 * cell + direction]
+        incoming[target] = incoming.get(target, 0) + strengths[cell] + (productions[cell] if direction == STILL else 0)
+    captured = cap_loss = exposure = 0
+    for target, strength in incoming.items():
+        if strength > 255:
+            cap_loss += strength - 255
+            strength = 255
+        enemy = sum(strengths[neighbor] for neighbor in adjacent_self[target] if owners[neighbor] not in (0, my_id))
+        if enemy:
+            exposure += min(strength, enemy)
+        elif owners[target] == 0 and strength > strengths[target]:
+            captured += productions[target]
+    return capture_weight * captured - cap_loss - exposure, captured, cap_loss, exposure
+
+
+class PlanPool:
+    "Worker processes playing the bot's turns under other options.  See the module docstring."
+
+    def __init__(self, game_map, variants, setup, play):
+        """
+        Forks one worker per variant (a dict of options).  In each worker, setup(variant) runs once to switch the bot
+        over to the variant, and then play() plays every turn from the loaded frame, returning its direction array.
+        """
+        self.game_map = game_map
+        self.variants = list(variants)
+        size = game_map.size
+        self.slot_size = TAG.size + 2 * size
+        self.shared = shared_memory.SharedMemory(create=True, size=2 * self.slot_size + size * len(self.variants))   # 2 frame slots of tag + owners + strengths, then a plan per worker
+        self.numbers = {}       # parent end of each worker's pipe -> worker number
+        self.workers = []
+        self.wins = Counter()   # variant index -> turns its plan was sent, None for the bot's own plan
+        self.sent = None        # variant index of the plan best() last returned, None for the bot's own
+        self.turn = None
+        context = get_context('fork')
+        for number, variant in enumerate(self.variants):
+            connection, child = context.Pipe()
+            worker = context.Process(target=self._work, args=(connection, child, number, variant, setup, play), daemon=True)
+            worker.start()
+            child.close()
+            self.numbers[connection] = number
+            self.workers.append(worker)
+        atexit.register(self.close)
+
+    def _work(self, parent, connection, number, variant, setup, play):
+        """
+        A worker's loop, until the bot closes its pipe or exits.  It leaves with os._exit so the bot's atexit handlers
+        (telemetry, this pool) only run in the bot.
+        """
+        try:
+            for other in chain(self.numbers, (parent,)):
+                other.close()       # the bot's ends of the pipes, inherited through the fork; left open, the bot's exit would never reach the worker
+            logging.disable(logging.CRITICAL)     # the log file belongs to the bot
+            setup(variant)
+            game_map, size = self.game_map, self.game_map.size
+            frames = self.shared.buf
+            plan = self._plan(number)
+            while True:
+                turn, received = connection.recv()
+                while connection.poll():        # fallen behind:  skip to the newest frame
+                    turn, received = connection.recv()
+                start = self._slot(turn)
+                if TAG.unpack_from(frames, start)[0] != turn:
+                    continue                    # already overwritten by a newer turn
+                owners, strengths = bytes(frames[start + TAG.size:start + TAG.size + size]), bytes(frames[start + TAG.size + size:start + self.slot_size])
+                if TAG.unpack_from(frames, start)[0] != turn:
+                    continue                    # overwritten while it was being copied
+                game_map.set_frame(owners, strengths, received)
+                plan[:] = play()
+                connection.send(turn)
+        except (EOFError, KeyboardInterrupt):
+            pass
+        finally:
+            os._exit(0)
+
+    def _slot(self, turn):
+        "Offset of the frame slot for turn."
+        return self.slot_size * (turn % 2)
+
+    def _plan(self, number):
+        "Worker number's plan slot."
+        size = self.game_map.size
+        start = 2 * self.slot_size + size * number
+        return self.shared.buf[start:start + size]
+
+    def submit(self, turn):
+        "Publishes game_map's current frame and sets the workers on it."
+        game_map, size = self.game_map, self.game_map.size
+        start = self._slot(turn)
+        frames = self.shared.buf
+        TAG.pack_into(frames, start, -1)
+        frames[start + TAG.size:start + TAG.size + size] = game_map.owners
+        frames[start + TAG.size + size:start + self.slot_size] = game_map.strengths
+        TAG.pack_into(frames, start, turn)
+        self.turn = turn
+        for connection in list(self.numbers):
+            try:
+                connection.send((turn, game_map.received))
+            except OSError:
+                del self.numbers[connection]    # the worker died; play on without it
+
+    def best(self, my_id, directions, deadline):
+        """
+        The best by score_plan() of directions (the bot's own plan) and the worker plans for this turn that arrive by
+        deadline, a time.monotonic() value.  Returns (directions, variant), where variant is None for the bot's own plan.
+        """
+        game_map = self.game_map
+        best_score, best, winner = score_plan(game_map, my_id, directions)[0], directions, None
+        pending = list(self.numbers)
+        while pending:
+            ready = wait(pending, max(0, deadline - time.monotonic()))
+            if not ready:
+                break
+            for connection in ready:
+                try:
+                    turn = connection.recv()
+                except EOFError:
+                    pending.remove(connection)
+                    del self.numbers[connection]
+                    continue
+                if turn != self.turn:
+                    continue            # a late plan from an earlier turn
+                pending.remove(connection)
+                number = self.numbers[connection]
+                plan = self._plan(number)
+                score = score_plan(game_map, my_id, plan)[0]
+                if score > best_score:
+                    best_score, best, winner = score, bytearray(plan), number
+        self.wins[winner] += 1
+        self.sent = winner
+        return best, None if winner is None else self.variants[winner]
+
+    def summary(self):
+        "How often each variant's plan was sent, e.g. 'own 140, {\"hold_until\": 5} 23, ...'."
+        return ', '.join(['own %d' % self.wins[None]] + ['%s %d' % (json.dumps(variant), self.wins[number]) for number, variant in enumerate(self.variants)])
+
+    def close(self):
+        "Logs summary(), stops the workers and frees the shared memory.  Safe to call more than once."
+        if self.shared is None:
+            return
+        logging.info('plans sent:  %s', self.summary())
+        for connection in self.numbers:
+            connection.close()
+        for worker in self.workers:
+            worker.join(0.1)
+            if worker.is_alive():
+                worker.terminate()
+        self.shared.close()
+        self.shared.unlink()
+        self.shared = None
@@ -0,0 +1,448 @@
+"""
+The potential field ("pf_map") shared by the erdman bots.
+
+Every cell not owned by the bot is a source with its initial_potential.  Cells are finalized in order of potential,
+Dijkstra-style.  Finalizing a cell offers its potential to each cardinal neighbor: an unowned neighbor gets the
+exponentially-weighted average of the finalized potential and its own strength/production, and a friendly neighbor
+keeps the finalized potential but is one step further from the border, which degrade() turns into
+potential + potential_degradation_step * distance ** 2.  See the README for what the field means to the bots.
+
+The queue is an IndexedHeap holding each cell at most once, so relaxing a neighbor is a decrease-key rather than a
+duplicate push.  Ties on potential are broken by a fixed per-cell rank: cell index order by default, or a permutation
+drawn from random.Random(seed).  Results are flat arrays indexed like hlt.GameMap's owners/strengths.
+
+Between turns, repair() brings the previous field up to date instead of rebuilding it.  Because the smoothing rule
+lets keys fall along a path, a cell's value depends on which of its neighbors were popped before it, so the result
+is defined by the pop order.  Every run records its pop order, and repair() runs it again:  the cells whose inputs
+changed, and from them every cell a changed value or a changed pop time reaches, go through the heap, and the rest
+are popped straight from the recorded order with their recorded values.  That is exactly what compute() does, for
+the cost of the reset cells plus one pass over the order.  repair() falls back to compute() when more than
+max_repair of the map changed.
+
+stack() splits the potential of the last compute() or repair() into layers without a second traversal.  Each layer has
+its own source values and is carried down the same parent tree with the same rules.  combine() then weights the layers
+into a pf_map, so a bot can reweight them turn by turn (or several times within one turn) for the cost of one pass over
+the cells.
+"""
+
+import heapq
+import random
+from array import array
+from itertools import compress
+
+INF = float('inf')
+MINING, COMBAT, BORDER = range(3)   # the layers stack() fills, in the order of PotentialField.layers
+
+
+class IndexedHeap:
+    "Binary min-heap of cell indices keyed by (key, rank), with decrease-key.  Each cell is in the heap at most once."
+
+    def __init__(self, size, rank):
+        self.rank = rank
+        self.keys = array('d', bytes(8 * size))
+        self.position = array('i', [-1]) * size     # slot of each cell in self.heap, -1 if not queued
+        self.heap = []                               # (key, rank, cell) entries
+
+    def __len__(self):
+        return len(self.heap)
+
+    def __contains__(self, cell):
+        return self.position[cell] >= 0
+
+    def push(self, cell, key):
+        "Inserts cell, or lowers its key if it is already queued with a higher one.  Returns False if nothing changed."
+        slot = self.position[cell]
+        if slot < 0:
+            slot = len(self.heap)
+            self.heap.append(None)
+        elif key >= self.keys[cell]:
+            return False
+        self.keys[cell] = key
+        self._sift_up((key, self.rank[cell], cell), slot)
+        return True
+
+    def pop(self):
+        "Removes and returns the cell with the smallest (key, rank)."
+        heap, position = self.heap, self.position
+        cell = heap[0][2]
+        position[cell] = -1
+        last = heap.pop()
+        if heap:
+            self._sift_down(last, 0)
+        return cell
+
+    def clear(self):
+        for _, _, cell in self.heap:
+            self.position[cell] = -1
+        self.heap.clear()
+
+    def load(self, cells, keys):
+        "Replaces the contents of the heap with the given cells and their keys, heapifying in one pass."
+        self.clear()
+        rank, position = self.rank, self.position
+        for cell, key in zip(cells, keys):
+            self.keys[cell] = key
+        self.heap = [(key, rank[cell], cell) for cell, key in zip(cells, keys)]
+        heapq.heapify(self.heap)
+        for slot, (_, _, cell) in enumerate(self.heap):
+            position[cell] = slot
+
+    def _sift_up(self, entry, slot):
+        heap, position = self.heap, self.position
+        while slot:
+            parent_slot = (slot - 1) >> 1
+            parent = heap[parent_slot]
+            if entry < parent:
+                heap[slot] = parent
+                position[parent[2]] = slot
+                slot = parent_slot
+            else:
+                break
+        heap[slot] = entry
+        position[entry[2]] = slot
+
+    def _sift_down(self, entry, slot):
+        heap, position = self.heap, self.position
+        end = len(heap)
+        child_slot = 2 * slot + 1
+        while child_slot < end:
+            child = heap[child_slot]
+            right_slot = child_slot + 1
+            if right_slot < end and heap[right_slot] < child:
+                child_slot = right_slot
+                child = heap[right_slot]
+            if child < entry:
+                heap[slot] = child
+                position[child[2]] = slot
+                slot = child_slot
+                child_slot = 2 * slot + 1
+            else:
+                break
+        heap[slot] = entry
+        position[entry[2]] = slot
+
+
+class PotentialField:
+    """
+    Reusable pf_map engine for one GameMap.  Call compute() once per turn; afterwards self.potential and self.distance
+    hold the (square_potential, friendly_distance) pair of every cell, and degrade(cell) gives the pf value.
+
+    neutral_only=True is the v17/v26 rule (only neutral, producing squares smooth the potential; enemy squares are inf),
+    neutral_only=False is the v12 rule (any unowned square with production smooths the potential).
+    """
+
+    def __init__(self, game_map, alpha, potential_degradation_step, neutral_only=True, seed=None, max_repair=0.25):
+        self.game_map = game_map
+        self.alpha = alpha
+        self.potential_degradation_step = potential_degradation_step
+        self.neutral_only = neutral_only
+        # what an unowned neighbor adds to the smoothed potential, by cell and strength (inf without production)
+        if neutral_only:
+            self._gain = game_map.strength_table(lambda strength, production: alpha * strength / production if production else INF)
+        else:
+            self._gain = game_map.strength_table(lambda strength, production: alpha * (strength / production if production else INF))
+        rank = list(range(game_map.size))
+        if seed is not None:
+            random.Random(seed).shuffle(rank)
+        self.rank = array('i', rank)
+        self.heap = IndexedHeap(game_map.size, self.rank)
+        self.potential = array('d', bytes(8 * game_map.size))
+        self.distance = array('i', bytes(4 * game_map.size))
+        self.finalized = bytearray(game_map.size)
+        self.parent = array('i', [-1]) * game_map.size     # the cell whose relaxation set each cell's value, -1 for a source
+        self.layers = array('d', bytes(8 * 3 * game_map.size))   # MINING, COMBAT and BORDER, game_map.size values each, see stack()
+        self.order = array('i')                            # cells in the order the last run popped them
+        self.pop_index = array('i', [game_map.size]) * game_map.size   # each cell's place in self.order, the map size if never popped
+        self.max_repair = max_repair                       # fraction of the map changed above which repair() just rebuilds
+        self.repaired = 0                                  # cells the last repair() reset, or the map size after a rebuild
+        self.pushes = 0                                    # heap inserts and decrease-keys made by the last compute() or repair()
+        self._initial = None
+        self._wall = bytes(game_map.size)
+
+    def degrade(self, cell):
+        return self.potential[cell] + self.potential_degradation_step * self.distance[cell] ** 2
+
+    def degraded(self):
+        "The pf value of every cell, as a list indexed by cell."
+        step = self.potential_degradation_step
+        return [potential + step * distance ** 2 for potential, distance in zip(self.potential, self.distance)]
+
+    def layer(self, index):
+        "One layer of self.layers (MINING, COMBAT or BORDER), as an array indexed by cell."
+        size = self.game_map.size
+        return self.layers[index * size:(index + 1) * size]
+
+    def stack(self, my_id, mining, combat):
+        """
+        Fills self.layers from the tree of the last compute() or repair() (the same tree, since repair() is exact),
+        without another traversal.  mining[cell] and combat[cell] are the source values of the unowned cells (see
+        features.FeatureMaps.source_layers).  MINING is smoothed like the potential, COMBAT only decays by 1 - alpha per
+        unowned step, and friendly cells copy both from their parent.  BORDER is the friendly distance.  When initial =
+        mining + enemy_ROI * combat, the potential equals MINING + enemy_ROI * COMBAT, up to rounding.  Unreached cells
+        get inf and 0.
+        """
+        game_map = self.game_map
+        size = game_map.size
+        owners, strengths, gain, parent = game_map.owners, game_map.strengths, self._gain, self.parent
+        keep, neutral_only = 1 - self.alpha, self.neutral_only
+        mined, pressure = [INF] * size, [0.0] * size
+        done = bytearray(size)      # 1 while a cell is on the current path, 2 once its values are set
+        for cell in range(size):
+            path = []
+            while not done[cell]:
+                done[cell] = 1
+                path.append(cell)
+                if parent[cell] < 0:
+                    break
+                cell = parent[cell]
+            if done[cell] == 1:     # reached a root:  the end of the path is a source
+                cell = path.pop()
+                if owners[cell] != my_id and parent[cell] < 0:
+                    mined[cell], pressure[cell] = mining[cell], combat[cell]
+                done[cell] = 2
+            for child in reversed(path):
+                above = parent[child]
+                if owners[child] == my_id:
+                    mined[child], pressure[child] = mined[above], pressure[above]
+                elif not (neutral_only and owners[child]):
+                    mined[child], pressure[child] = keep * mined[above] + gain[child][strengths[child]], keep * pressure[above]
+                done[child] = 2
+        self.layers = array('d', mined) + array('d', pressure) + array('d', self.distance)
+
+    def combine(self, weights):
+        """
+        pf_map from the stacked layers:  weights[MINING] * MINING + weights[COMBAT] * COMBAT + weights[BORDER] * BORDER ** 2
+        per cell, as a list.  (1, enemy_ROI, potential_degradation_step) gives degraded(), up to rounding.
+        """
+        size = self.game_map.size
+        mining_weight, combat_weight, border_weight = weights
+        layers = self.layers
+        return [mining_weight * mining + combat_weight * combat + border_weight * border * border
+                for mining, combat, border in zip(layers[:size], layers[size:2 * size], layers[2 * size:])]
+
+    def compute(self, my_id, initial, wall=None):
+        """
+        Rebuilds the field from scratch.  initial[cell] is the initial_potential of each unowned cell (owned cells are
+        ignored).  Cells flagged in wall (a per-cell 0/1 layer, as returned by features.FeatureMaps.wall) are sources,
+        but are never relaxed through, so the field routes around the wall (v26).  Friendly cells the field never
+        reaches are left at inf.
+        """
+        game_map = self.game_map
+        size = game_map.size
+        if wall is None:
+            wall = bytes(size)
+        heap, potential, distance, finalized, parent = self.heap, self.potential, self.distance, self.finalized, self.parent
+        finalized[:] = bytes(size)
+        potential[:] = array('d', [INF]) * size
+        distance[:] = array('i', bytes(4 * size))
+        parent[:] = array('i', [-1]) * size
+        owners = game_map.owners
+        sources = [cell for cell in range(size) if owners[cell] != my_id]
+        source_potentials = [initial[cell] for cell in sources]
+        heap.load(sources, source_potentials)
+        for cell, source_potential in zip(sources, source_potentials):
+            potential[cell] = source_potential
+        del self.order[:]
+        self._run(my_id, wall)
+        self._remember(initial, wall)
+        self.repaired = size
+
+    def repair(self, my_id, initial, changed, wall=None):
+        """
+        Brings the field computed on the previous turn up to date, given this turn's initial potentials and wall and the
+        cells whose owner or strength changed (GameMap.changed).  The result is the field compute() would build.  Returns
+        False if it fell back to a full rebuild.
+        """
+        game_map = self.game_map
+        size = game_map.size
+        if wall is None:
+            wall = bytes(size)
+        if self._initial is None:
+            self.compute(my_id, initial, wall)
+            return False
+        # a strength change only matters where strength enters the smoothing rule, i.e. not on friendly (or, for
+        # neutral_only, enemy) cells, whose strengths change nearly every turn
+        owners, strengths, old_owners, old_strengths = game_map.owners, game_map.strengths, self._owners, self._strengths
+        neutral_only = self.neutral_only
+        dirty = set(cell for cell in changed if owners[cell] != old_owners[cell]
+                    or (strengths[cell] != old_strengths[cell] and owners[cell] != my_id and (owners[cell] == 0 or not neutral_only)))
+        initial = array('d', initial)
+        dirty.update(compress(range(size), (int.from_bytes(self._wall, 'big') ^ int.from_bytes(wall, 'big')).to_bytes(size, 'big')))
+        old_initial, width = self._initial, game_map.width
+        for start in range(0, size, width):
+            if initial[start:start + width] != old_initial[start:start + width]:
+                dirty.update(cell for cell in range(start, start + width) if initial[cell] != old_initial[cell])
+        if len(dirty) > self.max_repair * size:
+            self.compute(my_id, initial, wall)
+            return False
+        self._replay(my_id, initial, wall, dirty)
+        self._remember(initial, wall)
+        return True
+
+    def _replay(self, my_id, initial, wall, dirty):
+        """
+        Runs the last run again, popping the cells it can't vouch for from the heap and the rest straight from its
+        recorded order.  A cell is reset (given its source potential and the offers of its neighbors popped so far, in
+        the order they were popped, and queued) when its inputs changed, or when a reset neighbor pops and either is
+        the neighbor its recorded value came from, or beats that value, or pops before that neighbor has.  A recorded
+        cell that comes up before the neighbor its value came from is reset too.  Every other cell holds its recorded
+        value and is ready exactly when it was last time, so it pops when its recorded (key, rank) comes up against the
+        heap, which is where compute() would pop it, and only has to offer to the reset cells.
+        """
+        game_map = self.game_map
+        size = game_map.size
+        heap, potential, distance, finalized, parent = self.heap, self.potential, self.distance, self.finalized, self.parent
+        keys, position, rank, pop, sift_up = heap.keys, heap.position, heap.rank, heap.pop, heap._sift_up
+        entries = heap.heap
+        owners, strengths, adjacent, gain = game_map.owners, game_map.strengths, game_map.adjacent, self._gain
+        keep, step, neutral_only = 1 - self.alpha, self.potential_degradation_step, self.neutral_only
+        recorded, recorded_index = self.order, self.pop_index
+        self.order = order = array('i')
+        self.pop_index = pop_index = array('i', [size]) * size
+        finalized[:] = bytes(size)
+        reset_cells, watched = bytearray(size), bytearray(size)     # watched:  next to a reset cell, so it has to offer when it pops
+        pushes = 0
+
+        def reset(cell):
+            reset_cells[cell] = 1
+            for neighbor in adjacent[cell]:
+                watched[neighbor] = 1
+            queued = owners[cell] != my_id
+            key = potential[cell] = initial[cell] if queued else INF
+            distance[cell], parent[cell] = 0, -1
+            if not wall[cell]:
+                for _, neighbor in sorted((pop_index[neighbor], neighbor) for neighbor in adjacent[cell] if finalized[neighbor]):
+                    if owners[cell] != my_id:
+                        if neutral_only and owners[cell]:
+                            offer = INF
+                        else:
+                            offer = keep * potential[neighbor] + gain[cell][strengths[cell]]
+                        neighbor_potential, neighbor_distance = offer, distance[neighbor]
+                    else:
+                        neighbor_potential, neighbor_distance = potential[neighbor], distance[neighbor] + 1
+                        offer = neighbor_potential + step * neighbor_distance ** 2
+                    if not queued:      # a friendly cell's first offer goes in regardless
+                        queued = True
+                    elif offer > key or (offer == key and (neighbor_potential, neighbor_distance) >= (potential[cell], distance[cell])):
+                        continue
+                    key = offer
+                    potential[cell], distance[cell], parent[cell] = neighbor_potential, neighbor_distance, neighbor
+            if queued:
+                heap.push(cell, key)
+
+        for cell in dirty:
+            reset(cell)
+        pushes += len(entries)
+        next_recorded, end = 0, len(recorded)
+        while True:
+            while next_recorded < end:      # the next recorded cell that still holds, if any
+                head = recorded[next_recorded]
+                if not reset_cells[head]:
+                    above = parent[head]
+                    if above < 0 or finalized[above]:
+                        break
+                    reset(head)
+                    pushes += 1
+                next_recorded += 1
+            else:
+                head = -1
+            if entries and (head < 0 or entries[0] < (keys[head], rank[head], head)):
+                cell = pop()
+            elif head >= 0:
+                cell = head
+                next_recorded += 1
+            else:
+                break
+            finalized[cell] = 1
+            pop_index[cell] = len(order)
+            order.append(cell)
+            if not (reset_cells[cell] or watched[cell]):
+                continue
+            square_potential, friendly_distance = potential[cell], distance[cell]
+            for neighbor in adjacent[cell]:
+                if finalized[neighbor] or wall[neighbor] or not (reset_cells[neighbor] or reset_cells[cell]):
+                    continue
+                if owners[neighbor] != my_id:
+                    if neutral_only and owners[neighbor]:
+                        key = INF
+                    else:
+                        key = keep * square_potential + gain[neighbor][strengths[neighbor]]
+                    neighbor_potential, neighbor_distance = key, friendly_distance
+                else:
+                    neighbor_potential, neighbor_distance = square_potential, friendly_distance + 1
+                    key = square_potential + step * neighbor_distance ** 2
+                if not reset_cells[neighbor]:
+                    # a recorded cell offered something by a reset one:  it holds if its own value is already in and the offer doesn't beat it
+                    offer, held = (key, neighbor_potential, neighbor_distance), (keys[neighbor], potential[neighbor], distance[neighbor])
+                    above = parent[neighbor]
+                    if recorded_index[neighbor] == size or above == cell or (above >= 0 and not finalized[above]) or offer < held:
+                        reset(neighbor)
+                        pushes += 1
+                    continue
+                slot = position[neighbor]
+                if slot < 0:
+                    slot = len(entries)
+                    entries.append(None)
+                elif key > keys[neighbor]:
+                    continue
+                elif key == keys[neighbor]:
+                    if (neighbor_potential, neighbor_distance) < (potential[neighbor], distance[neighbor]):
+                        potential[neighbor], distance[neighbor], parent[neighbor] = neighbor_potential, neighbor_distance, cell
+                    continue
+                keys[neighbor] = key
+                potential[neighbor], distance[neighbor], parent[neighbor] = neighbor_potential, neighbor_distance, cell
+                sift_up((key, rank[neighbor], neighbor), slot)
+                pushes += 1
+        self.pushes = pushes
+        self.repaired = reset_cells.count(1)
+
+    def _remember(self, initial, wall):
+        self._initial = array('d', initial)
+        self._wall = bytes(wall)
+        self._owners = array('B', self.game_map.owners)
+        self._strengths = array('B', self.game_map.strengths)
+
+    def _run(self, my_id, wall):
+        "Pops and relaxes until the heap is empty, appending to self.order.  push() is inlined here; this loop is most of the cost of a turn."
+        game_map = self.game_map
+        heap, potential, distance, finalized, parent = self.heap, self.potential, self.distance, self.finalized, self.parent
+        keys, position, rank, pop, sift_up = heap.keys, heap.position, heap.rank, heap.pop, heap._sift_up
+        entries = heap.heap
+        order, pop_index = self.order, self.pop_index
+        pushes = 0
+        owners, strengths, adjacent, gain = game_map.owners, game_map.strengths, game_map.adjacent, self._gain
+        keep, step, neutral_only = 1 - self.alpha, self.potential_degradation_step, self.neutral_only
+        while entries:
+            cell = pop()
+            finalized[cell] = 1
+            pop_index[cell] = len(order)
+            order.append(cell)
+            square_potential, friendly_distance = potential[cell], distance[cell]
+            for neighbor in adjacent[cell]:
+                if finalized[neighbor] or wall[neighbor]:
+                    continue
+                if owners[neighbor] != my_id:
+                    if neutral_only and owners[neighbor]:
+                        key = INF
+                    else:
+                        key = keep * square_potential + gain[neighbor][strengths[neighbor]]
+                    neighbor_potential, neighbor_distance = key, friendly_distance
+                else:
+                    neighbor_potential, neighbor_distance = square_potential, friendly_distance + 1
+                    key = square_potential + step * neighbor_distance ** 2
+                slot = position[neighbor]
+                if slot < 0:
+                    slot = len(entries)
+                    entries.append(None)
+                elif key > keys[neighbor]:
+                    continue
+                elif key == keys[neighbor]:
+                    # equal keys: keep the lower (potential, distance) pair, the order a tuple-keyed heap would pop them in
+                    if (neighbor_potential, neighbor_distance) < (potential[neighbor], distance[neighbor]):
+                        potential[neighbor], distance[neighbor], parent[neighbor] = neighbor_potential, neighbor_distance, cell
+                    continue
+                keys[neighbor] = key
+                potential[neighbor], distance[neighbor], parent[neighbor] = neighbor_potential, neighbor_distance, cell
+                sift_up((key, rank[neighbor], neighbor), slot)
+                pushes += 1
+        self.pushes = pushes
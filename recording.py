@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Compact binary recordings of a bot's games:  every frame's owners and strengths and the moves the bot sent.
+
+A bot started with --record sets game_map.recorder, and hlt.send_moves() appends a record per turn, just before it
+sends the moves (simulator.py's InProcessBot, which skips send_moves, records the same way).  The file is:
+
+    header      '<4sBHHB' magic b'HREC', version, width, height, the bot's player id;  then the productions, a byte per cell
+    records     '<IB' payload length, keyframe flag;  then the owner, strength and direction layers, each '<I' length + data
+    index       the records' file offsets as '<Q' each;  then '<QI4s' index offset, record count, b'HIDX'
+
+Every layer is a byte per cell (directions as in hlt.send_moves, NO_MOVE where nothing was sent).  A keyframe holds
+the layers themselves, every other record their XOR with the previous record's, and either way the bytes are
+zero-run encoded as '<HH' (zeros, literal count) pairs, each followed by its literal bytes.  Between turns most
+neutral and enemy squares don't change, so a delta is mostly zero runs.  A keyframe every KEYFRAME_INTERVAL records
+bounds the work to reach any turn.
+
+Records are written unbuffered as they happen, and the index only at exit, so a bot that is killed mid-game still
+leaves a readable file:  the reader rebuilds a missing index by hopping from record header to record header.
+
+    python3 recording.py roibot.hrec          # summary
+    python3 recording.py roibot.hrec 120      # territory and strength per player on turn 120
+"""
+
+import argparse
+import atexit
+import mmap
+import re
+import struct
+from array import array
+from collections import Counter
+
+from hlt import NO_MOVE
+
+MAGIC, INDEX_MAGIC, VERSION = b'HREC', b'HIDX', 1
+KEYFRAME_INTERVAL = 16
+HEADER = struct.Struct('<4sBHHB')
+RECORD = struct.Struct('<IB')
+LAYER = struct.Struct('<I')
+RUN = struct.Struct('<HH')
+FOOTER = struct.Struct('<QI4s')
+
+_ZEROS = re.compile(b'\x00{4,}')    # shorter zero runs are cheaper as literals than as a new pair
+
+
+def encode_layer(data):
+    "Zero-run encoding of a byte string, as RUN pairs each followed by its literals."
+    chunks, position, zeros = [], 0, 0
+    for run in _ZEROS.finditer(data):
+        start, end = run.span()
+        chunks += (RUN.pack(zeros, start - position), data[position:start])
+        position, zeros = end, end - start
+    chunks += (RUN.pack(zeros, len(data) - position), data[position:])
+    return b''.join(chunks)
+
+
+def decode_layer(data, size):
+    "Inverse of encode_layer, given the decoded length."
+    layer, position, end = bytearray(), 0, len(data)
+    while position < end:
+        zeros, literals = RUN.unpack_from(data, position)
+        position += RUN.size
+        layer += bytes(zeros)
+        layer += data[position:position + literals]
+        position += literals
+    assert len(layer) == size
+    return layer
+
+
+def xor(a, b):
+    "Bytewise XOR of two equally long byte strings, through big integers."
+    return (int.from_bytes(a, 'big') ^ int.from_bytes(b, 'big')).to_bytes(len(a), 'big')
+
+
+class Recorder:
+    "Appends a game to path, one record per send_moves().  See the module docstring for the format."
+
+    def __init__(self, path, game_map, my_id, keyframe_interval=KEYFRAME_INTERVAL):
+        self.file = open(path, 'wb', buffering=0)
+        self.file.write(HEADER.pack(MAGIC, VERSION, game_map.width, game_map.height, my_id) + bytes(game_map.productions))
+        self.keyframe_interval = keyframe_interval
+        self.offsets = array('Q')
+        self.previous = None
+        self.position = HEADER.size + game_map.size
+        atexit.register(self.close)
+
+    def record(self, game_map, directions):
+        layers = (bytes(game_map.owners), bytes(game_map.strengths), bytes(directions))
+        keyframe = len(self.offsets) % self.keyframe_interval == 0
+        encoded = [encode_layer(layer if keyframe else xor(layer, previous)) for layer, previous in zip(layers, self.previous or layers)]
+        payload = b''.join(LAYER.pack(len(layer)) + layer for layer in encoded)
+        self.offsets.append(self.position)
+        self.file.write(RECORD.pack(len(payload), keyframe) + payload)
+        self.position += RECORD.size + len(payload)
+        self.previous = layers
+
+    def close(self):
+        "Writes the index.  Safe to call more than once."
+        if self.file.closed:
+            return
+        self.file.write(self.offsets.tobytes() + FOOTER.pack(self.position, len(self.offsets), INDEX_MAGIC))
+        self.file.close()
+
+
+class Recording:
+    """
+    A recorded game, memory-mapped.  frame(n) decodes the n-th turn as (owners, strengths, directions) bytearrays,
+    starting from the nearest keyframe; reading turns in order decodes each record once.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.width, self.height, self.player = HEADER.unpack_from(self.data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('%s is not a version %d game recording' % (path, VERSION))
+        self.size = self.width * self.height
+        self.productions = array('B', self.data[HEADER.size:HEADER.size + self.size])
+        self.offsets = self._index()
+        self.keyframes = array('B', (self._keyframe(offset) for offset in self.offsets))
+        self._cached = None     # (n, layers) of the last frame decoded
+
+    def _index(self):
+        "The record offsets, from the index at the end of the file or, if the game never got to write it, from the records."
+        data = self.data
+        if len(data) >= FOOTER.size:
+            position, count, magic = FOOTER.unpack_from(data, len(data) - FOOTER.size)
+            if magic == INDEX_MAGIC and position + 8 * count + FOOTER.size == len(data):
+                return array('Q', data[position:position + 8 * count])
+        offsets, position = array('Q'), HEADER.size + self.size
+        while position + RECORD.size <= len(data):
+            length, _ = RECORD.unpack_from(data, position)
+            if position + RECORD.size + length > len(data):
+                break           # cut off mid-record
+            offsets.append(position)
+            position += RECORD.size + length
+        return offsets
+
+    def _keyframe(self, offset):
+        return RECORD.unpack_from(self.data, offset)[1]
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def _layers(self, n):
+        "The n-th record's three layers, still XORed with the previous frame's unless it's a keyframe."
+        position = self.offsets[n] + RECORD.size
+        layers = []
+        for _ in range(3):
+            length, = LAYER.unpack_from(self.data, position)
+            position += LAYER.size
+            layers.append(decode_layer(self.data[position:position + length], self.size))
+            position += length
+        return layers
+
+    def frame(self, n):
+        "(owners, strengths, directions) on the n-th recorded turn, as bytearrays with a byte per cell."
+        if not 0 <= n < len(self.offsets):
+            raise IndexError('recording has %d frames' % len(self.offsets))
+        if self._cached is not None and self._cached[0] <= n and not any(self.keyframes[self._cached[0] + 1:n + 1]):
+            start, layers = self._cached
+        else:
+            start = n
+            while not self.keyframes[start]:
+                start -= 1
+            layers = self._layers(start)
+        for record in range(start + 1, n + 1):
+            layers = [bytearray(xor(layer, delta)) for layer, delta in zip(layers, self._layers(record))]
+        self._cached = (n, layers)
+        return tuple(bytearray(layer) for layer in layers)
+
+    def __iter__(self):
+        return map(self.frame, range(len(self.offsets)))
+
+    def close(self):
+        self.data.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Summarizes a game recording, or one turn of it.')
+    parser.add_argument('path', type=str)
+    parser.add_argument('turn', type=int, nargs='?', default=None, help='Turn to show territory and strength per player for.')
+    args = parser.parse_args()
+    recording = Recording(args.path)
+    if args.turn is None:
+        print('%dx%d, player %d, %d frames, %d bytes (%.0f per frame)' % (recording.width, recording.height, recording.player, len(recording),
+              len(recording.data), (len(recording.data) - HEADER.size - recording.size) / max(1, len(recording))))
+        return
+    owners, strengths, directions = recording.frame(args.turn)
+    territory, strength = Counter(owners), Counter()
+    for owner, value in zip(owners, strengths):
+        strength[owner] += value
+    for player in sorted(territory):
+        print('player %d:  %d squares, %d strength' % (player, territory[player], strength[player]))
+    print('moves sent:  %d' % (len(directions) - directions.count(NO_MOVE)))
+
+
+if __name__ == '__main__':
+    main()
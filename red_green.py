@@ -0,0 +1,78 @@
+"""
+v26's red_green trees, kept in flat arrays.
+
+Every square I own points at its lowest-pf neighbor (self.parent).  A neutral square with strength that some of my
+squares point at is the root of a tree of all my squares that would flow to it.  Each tree is expanded level by level
+from its root in one breadth-first pass, which gives every node its depth and root and every level its strength and
+production sums, without nested dicts, recursion or sorting the walk.  See the README for what the lights mean.
+"""
+
+import heapq
+from array import array
+
+
+class RedGreenTrees:
+    "Red/green trees of player my_id on one GameMap.  Call build() once per turn with the pf values, then lights()."
+
+    def __init__(self, game_map, my_id):
+        self.game_map = game_map
+        self.my_id = my_id
+        self.parent = array('i', [-1]) * game_map.size        # lowest-pf neighbor of each of my squares, -1 elsewhere
+        self.root = array('i', [-1]) * game_map.size          # root of the tree each square is in, -1 if none
+        self.depth = array('i', bytes(4 * game_map.size))     # level of each square in its tree, the root's children being 1
+        self.levels = {}                                      # root -> list of (squares, strength, production) per level
+
+    def build(self, pf_map):
+        game_map, my_id = self.game_map, self.my_id
+        owners, strengths, productions, adjacent = game_map.owners, game_map.strengths, game_map.productions, game_map.adjacent
+        parent, root_of, depth = self.parent, self.root, self.depth
+        parent[:] = array('i', [-1]) * game_map.size
+        root_of[:] = parent
+        depth[:] = array('i', bytes(4 * game_map.size))
+        key = pf_map.__getitem__
+        children = {}
+        for square in range(game_map.size):
+            if owners[square] == my_id:
+                parent[square] = best = min(adjacent[square], key=key)    # first of N, E, S, W on ties
+                children.setdefault(best, []).append(square)
+        self.levels = levels = {}
+        for root in children:
+            if owners[root] != 0 or strengths[root] == 0:
+                continue
+            tree = levels[root] = []
+            level, distance = children[root], 1
+            while level:
+                for square in level:
+                    root_of[square], depth[square] = root, distance
+                tree.append((level, sum(strengths[square] for square in level), sum(productions[square] for square in level)))
+                level = [child for square in level for child in children.get(square, ())]
+                distance += 1
+
+    def lights(self):
+        """
+        (redlight, greenlight):  for each tree, redlight the trunk that can't capture the root yet, and greenlight the
+        fewest, strongest squares of the first level that can (ties by x, then y).
+        """
+        game_map = self.game_map
+        strengths, width = game_map.strengths, game_map.width
+        redlight, greenlight = set(), set()
+        for root, tree in self.levels.items():
+            accum_production = accum_strength = 0
+            for squares, level_strength, level_production in tree:
+                if accum_strength + accum_production > strengths[root]:   # accumulation is big enough, don't need to greenlight next square
+                    break
+                elif level_strength + accum_strength + accum_production > strengths[root]:
+                    # partial selection:  pop the strongest squares until they are enough
+                    needed = strengths[root] - accum_strength - accum_production
+                    candidates = [(-strengths[square], square % width, square) for square in squares]
+                    heapq.heapify(candidates)
+                    while needed >= 0:
+                        strength, _, square = heapq.heappop(candidates)
+                        needed += strength
+                        greenlight.add(square)
+                    break
+                else:
+                    accum_strength += level_strength + accum_production
+                    accum_production += level_production
+                    redlight.update(squares)
+        return redlight, greenlight
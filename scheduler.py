@@ -0,0 +1,67 @@
+"""
+Per-turn deadline tracking for the erdman bots.
+
+Halite ejects a bot that takes longer than its per-turn limit to answer a frame, so the bots run each turn's phases
+(frame decode, features, potential field, trees, move assignment) in priority order and ask the scheduler before
+every optional one whether it still fits.  The clock starts when the frame was read off stdin (GameMap.received).
+Each phase's duration is tracked as an exponentially weighted average, so "fits" means the time used so far plus the
+expected cost of the remaining phases stays under the budget.  Move assignment goes strongest square first, so when
+time runs out mid-assignment the moves already made are still a sensible partial answer; unassigned squares simply
+stay STILL, which is what the game does with squares that get no move.
+
+Every skipped or shortened phase is recorded in self.degraded for the turn and counted in self.degradations.
+"""
+
+import time
+from collections import Counter
+
+
+class TurnScheduler:
+    "Deadline bookkeeping for one bot.  budget is the per-turn time in seconds, of which only the fraction margin is planned for."
+
+    def __init__(self, budget=1.0, margin=0.8, smoothing=0.3):
+        self.budget = budget
+        self.margin = margin
+        self.smoothing = smoothing
+        self.estimates = {}             # phase -> smoothed duration in seconds
+        self.durations = {}             # phase -> duration this turn
+        self.degraded = []              # what was skipped or cut short this turn
+        self.degradations = Counter()   # the same, over the whole game
+        self.started = self._mark = time.monotonic()
+
+    def start(self, received=None):
+        "Starts a turn's clock at received (a time.monotonic() value, e.g. GameMap.received), or now."
+        self.started = self._mark = time.monotonic() if received is None else received
+        self.durations = {}
+        self.degraded = []
+
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def deadline(self):
+        "The time.monotonic() value by which the turn's moves should be sent."
+        return self.started + self.margin * self.budget
+
+    def phase(self, name):
+        "Marks the end of phase name, folding its duration into the estimate for future turns."
+        now = time.monotonic()
+        duration, self._mark = now - self._mark, now
+        self.durations[name] = duration
+        estimate = self.estimates.get(name)
+        self.estimates[name] = duration if estimate is None else estimate + self.smoothing * (duration - estimate)
+        return duration
+
+    def fits(self, *phases):
+        "True if the given phases, at their estimated durations, can still finish before the deadline."
+        return time.monotonic() + sum(self.estimates.get(name, 0) for name in phases) <= self.deadline()
+
+    def allow(self, feature, *phases):
+        "fits(*phases), recording feature as degraded when it doesn't."
+        if self.fits(*phases):
+            return True
+        self.degrade(feature)
+        return False
+
+    def degrade(self, feature):
+        self.degraded.append(feature)
+        self.degradations[feature] += 1
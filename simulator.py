@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+A local Halite game environment:  seeded maps, the game rules, and drivers for bots in this process or in subprocesses.
+
+The rules follow the official environment.  Each turn:
+1. Every owned square gets a move (STILL unless its owner said otherwise).  A STILL square gains its production,
+   capped at 255.
+2. Pieces move.  Pieces of one player that end up on the same square merge, capped at 255.  A square a piece moved
+   off stays with its owner as a 0-strength piece, unless someone takes it.
+3. Every piece deals its strength as damage to each enemy piece on its own square and on the four adjacent squares
+   (overkill).  A neutral square damages, and is damaged by, only the pieces on that square.  A piece whose damage is
+   at least its strength dies.  Survivors take their squares with what strength they have left.
+A player is out once they own no squares.  The game ends when one player is left or after 10 * sqrt(width * height)
+turns.  Players are ranked by how long they lasted, then by territory, then by total strength.
+
+The state is kept in flat lists indexed by y * width + x, like hlt.GameMap's arrays mode.  Bots see exactly what the
+game environment would send them:  the init strings and a frame string per turn.  InProcessBot feeds those through
+hlt.GameMap and a bot's init()/play_turn() (see benchmark.py) and skips only the text encoding of the moves.  Its
+tie breaks draw from a random.Random seeded from the game's seed, so a game replays exactly without touching the
+global random state.  SubprocessBot talks to any bot command over pipes, like the real environment, and runs it in
+--log_dir (by default the current directory), where its log files land.
+
+    python3 simulator.py --bot v26 --bot v17 --width 30 --height 30 --seed 7
+    python3 simulator.py --bot "v26 --alpha 0.12" --command "python3 $PWD/erdman_v17.py --name v17" --games 10 --log_dir /tmp
+"""
+
+import argparse
+import importlib.util
+import math
+import os
+import random
+import shlex
+import subprocess
+import sys
+import time
+from itertools import compress
+
+import hlt
+from hlt import STILL
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+MOVED = bytes(int(direction <= STILL) for direction in range(256))     # translate table:  cells of a direction array with a move
+
+
+def encode_frame(owners, strengths):
+    "The game environment's frame string for flat owner/strength sequences:  (count, owner) runs, then every strength."
+    tokens = []
+    count, current = 0, owners[0]
+    for owner in owners:
+        if owner == current:
+            count += 1
+        else:
+            tokens += (str(count), str(current))
+            count, current = 1, owner
+    tokens += (str(count), str(current))
+    tokens += map(str, strengths)
+    return ' '.join(tokens).encode()
+
+
+def generate_map(width, height, players, seed):
+    """
+    (productions, strengths, starts) for a seeded map.  One smoothed random tile is repeated across the map for every
+    player, so each starts from the same surroundings (exactly so when the tiles divide the map), and each player's
+    start is the best-producing square of its tile.
+    """
+    rng = random.Random(seed)
+    columns = next(columns for columns in (3, 2, 1, 5) if players % columns == 0 and players // columns <= 2) if players > 1 else 1
+    rows = players // columns
+    tile_width, tile_height = -(-width // columns), -(-height // rows)
+    raw_productions = [rng.random() ** 2 for _ in range(tile_width * tile_height)]
+    raw_strengths = [rng.random() for _ in range(tile_width * tile_height)]
+
+    def smooth(values, passes):
+        for _ in range(passes):
+            values = [(2 * values[y * tile_width + x] + sum(values[((y + dy) % tile_height) * tile_width + (x + dx) % tile_width] for dx, dy in ((0, -1), (1, 0), (0, 1), (-1, 0)))) / 6
+                      for y in range(tile_height) for x in range(tile_width)]
+        return values
+
+    tile_productions = [int(value * 12 + 1.5) if rng.random() > 0.02 else 0 for value in smooth(raw_productions, 2)]
+    tile_strengths = [min(255, int(value * 255)) for value in smooth(raw_strengths, 3)]
+    best = max(range(len(tile_productions)), key=lambda cell: (tile_productions[cell], -tile_strengths[cell]))
+    productions, strengths = [], []
+    for y in range(height):
+        for x in range(width):
+            cell = (y % tile_height) * tile_width + x % tile_width
+            productions.append(tile_productions[cell])
+            strengths.append(tile_strengths[cell])
+    starts = []
+    for player in range(players):
+        x = (player % columns) * tile_width + best % tile_width
+        y = (player // columns) * tile_height + best // tile_width
+        starts.append((y % height) * width + x % width)
+    return productions, strengths, starts
+
+
+class InProcessBot:
+    "One of this repo's bots (e.g. 'v26' or a path to erdman_v26.py) loaded as its own module copy and called directly."
+
+    def __init__(self, spec):
+        tokens = shlex.split(spec)
+        path = tokens[0] if tokens[0].endswith('.py') else os.path.join(HERE, 'erdman_' + tokens[0] + '.py')
+        self.argv = tokens[1:]
+        self.name = os.path.basename(path)[:-3]
+        self.path = path
+
+    def start(self, player_id, size_string, production_string, frame, seed=None):
+        if HERE not in sys.path:
+            sys.path.insert(0, HERE)
+        # a fresh module per player, so two copies of one bot don't share their globals
+        spec = importlib.util.spec_from_file_location('%s_player%d' % (self.name, player_id), self.path)
+        self.bot = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(self.bot)
+        self.bot.random = random.Random(seed)     # the bot's own random tie breaks
+        self.game_map = hlt.GameMap(size_string, production_string, frame, arrays=True)
+        options = self.bot.parser.parse_args(self.argv)
+        self.bot.init(player_id, self.game_map, options)
+        return options.name
+
+    def turn(self, frame):
+        self.game_map.get_frame(frame)
+        directions = self.bot.play_turn()
+        if self.game_map.recorder is not None:      # what hlt.send_moves would do for a bot started with --record
+            self.game_map.recorder.record(self.game_map, directions)
+        return [(square, directions[square]) for square in compress(range(len(directions)), directions.translate(MOVED))]
+
+    def close(self):
+        pass
+
+
+class SubprocessBot:
+    "Any Halite bot, run as a command that speaks the game protocol on stdin/stdout."
+
+    def __init__(self, command, width, cwd=None):
+        self.command = shlex.split(command)
+        self.width = width
+        self.cwd = cwd      # where the bot runs and writes its log files; None is the current directory
+
+    def start(self, player_id, size_string, production_string, frame, seed=None):
+        self.process = subprocess.Popen(self.command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, cwd=self.cwd)
+        self._send(b'\n'.join((str(player_id).encode(), size_string.encode(), production_string.encode(), frame)))
+        return self.process.stdout.readline().decode().strip()
+
+    def turn(self, frame):
+        self._send(frame)
+        tokens = list(map(int, self.process.stdout.readline().split()))
+        width = self.width
+        # the environment numbers directions STILL, NORTH, EAST, SOUTH, WEST; hlt numbers them NORTH ... STILL
+        return [(tokens[k + 1] * width + tokens[k], (tokens[k + 2] - 1) % 5) for k in range(0, len(tokens) - 2, 3)]
+
+    def _send(self, data):
+        self.process.stdin.write(data + b'\n')
+        self.process.stdin.flush()
+
+    def close(self):
+        self.process.kill()
+        self.process.wait()
+
+
+class Game:
+    "One game between bots (InProcessBot / SubprocessBot), which become players 1, 2, ... in order."
+
+    def __init__(self, bots, width, height, seed, max_turns=None):
+        self.bots = bots
+        self.width, self.height, self.size = width, height, width * height
+        self.seed = seed
+        self.max_turns = max_turns or int(10 * math.sqrt(width * height))
+        self.productions, self.strengths, starts = generate_map(width, height, len(bots), seed)
+        self.owners = [0] * self.size
+        for player, cell in enumerate(starts, 1):
+            self.owners[cell], self.strengths[cell] = player, 255
+        self.adjacent_self = [tuple(((y + dy) % height) * width + (x + dx) % width for dx, dy in ((0, -1), (1, 0), (0, 1), (-1, 0), (0, 0)))
+                              for y in range(height) for x in range(width)]     # NORTH, EAST, SOUTH, WEST, STILL, as in hlt
+        self.cap_loss = [0] * (len(bots) + 1)       # strength lost to the 255 cap, per player
+
+    def frame(self):
+        return encode_frame(self.owners, self.strengths)
+
+    def step(self, moves):
+        "Plays one turn.  moves maps player -> iterable of (cell, direction), in hlt's direction numbering."
+        size, players = self.size, len(self.bots)
+        owners, strengths, productions, adjacent_self = self.owners, self.strengths, self.productions, self.adjacent_self
+        direction = [STILL] * size
+        for player, player_moves in moves.items():
+            for cell, move in player_moves:
+                if owners[cell] == player:
+                    direction[cell] = move
+
+        # per player, flat piece strengths and presence (a piece can have strength 0), and the cells holding one
+        piece = [None] + [[0] * size for _ in range(players)]
+        present = [None] + [bytearray(size) for _ in range(players)]
+        cells = [None] + [[] for _ in range(players)]
+        for cell in range(size):
+            player = owners[cell]
+            if not player:
+                continue
+            strength, move = strengths[cell], direction[cell]
+            if move == STILL:
+                strength = min(255, strength + productions[cell])
+            player_piece, player_present = piece[player], present[player]
+            for target, amount in ((adjacent_self[cell][move], strength), (cell, 0)):
+                if not player_present[target]:
+                    player_present[target] = 1
+                    cells[player].append(target)
+                total = player_piece[target] + amount
+                if total > 255:
+                    self.cap_loss[player] += total - 255
+                    total = 255
+                player_piece[target] = total
+            owners[cell] = strengths[cell] = 0      # neutral squares keep their strength; vacated ones are empty for now
+
+        # damage to a piece is everything on and next to it, minus its own player's part
+        alive = [player for player in range(1, players + 1) if cells[player]]
+        total, count = [0] * size, [0] * size
+        for player in alive:
+            player_piece = piece[player]
+            for cell in cells[player]:
+                total[cell] += player_piece[cell]
+                count[cell] += 1
+        survivors = []
+        for player in alive:
+            player_piece, player_present = piece[player], present[player]
+            for cell in cells[player]:
+                a, b, c, d, e = adjacent_self[cell]
+                enemies = count[a] + count[b] + count[c] + count[d] + count[e] - player_present[a] - player_present[b] - player_present[c] - player_present[d] - player_present[e]
+                damage = total[a] + total[b] + total[c] + total[d] + total[e] - player_piece[a] - player_piece[b] - player_piece[c] - player_piece[d] - player_piece[e]
+                if strengths[cell]:     # still neutral
+                    enemies, damage = enemies + 1, damage + strengths[cell]
+                strength = player_piece[cell]
+                if not enemies:
+                    survivors.append((cell, player, strength))
+                elif damage < strength:
+                    survivors.append((cell, player, strength - damage))
+        for cell in range(size):
+            if strengths[cell] and count[cell]:
+                strengths[cell] = max(0, strengths[cell] - total[cell])
+        for cell, player, strength in survivors:
+            owners[cell], strengths[cell] = player, strength
+
+    def territories(self):
+        counts = [0] * (len(self.bots) + 1)
+        for owner in self.owners:
+            counts[owner] += 1
+        return counts
+
+    def run(self):
+        """
+        Plays the game to the end and returns a dict with the players' names, ranks (1 is best), final territories,
+        the number of turns, and the seconds spent in the rules versus in the bots.
+        """
+        players = len(self.bots)
+        size_string = '%d %d' % (self.width, self.height)
+        production_string = ' '.join(map(str, self.productions))
+        rng = random.Random(self.seed)
+        frame = self.frame()
+        names = [bot.start(player, size_string, production_string, frame, rng.getrandbits(64)) for player, bot in enumerate(self.bots, 1)]
+        eliminated = {}
+        rules_time = bots_time = 0
+        turn = 0
+        try:
+            while turn < self.max_turns:
+                territories = self.territories()
+                alive = [player for player in range(1, players + 1) if territories[player]]
+                for player in range(1, players + 1):
+                    if not territories[player] and player not in eliminated:
+                        eliminated[player] = turn
+                if len(alive) <= 1:
+                    break
+                start = time.perf_counter()
+                moves = {player: self.bots[player - 1].turn(frame) for player in alive}
+                bots_time += time.perf_counter() - start
+                start = time.perf_counter()
+                self.step(moves)
+                turn += 1
+                frame = self.frame()
+                rules_time += time.perf_counter() - start
+        finally:
+            for bot in self.bots:
+                bot.close()
+        territories = self.territories()
+        total_strengths = [0] * (players + 1)
+        for owner, strength in zip(self.owners, self.strengths):
+            total_strengths[owner] += strength
+        order = sorted(range(1, players + 1), key=lambda player: (eliminated.get(player, turn + 1), territories[player], total_strengths[player]), reverse=True)
+        ranks = {player: rank for rank, player in enumerate(order, 1)}
+        return dict(names=names, ranks=[ranks[player] for player in range(1, players + 1)], territories=territories[1:],
+                    turns=turn, rules_seconds=rules_time, bot_seconds=bots_time)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Plays local Halite games between bots.')
+    parser.add_argument('--bot', dest='players', action='append', type=lambda spec: ('bot', spec), default=[],
+                        help='A bot of this repo run in this process:  "v26" or "erdman_v26.py", optionally followed by its options.')
+    parser.add_argument('--command', dest='players', action='append', type=lambda spec: ('command', spec),
+                        help='Any bot command, run as a subprocess speaking the Halite protocol.')
+    parser.add_argument('--width', type=int, default=30)
+    parser.add_argument('--height', type=int, default=30)
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the first game\'s map; game k uses seed + k.  Default is 0')
+    parser.add_argument('--games', type=int, default=1)
+    parser.add_argument('--max_turns', type=int, default=None, help='Default is 10 * sqrt(width * height), as on the site.')
+    parser.add_argument('--log_dir', type=str, default=None, help='Directory the --command bots run in, and write their log files to.  Default is the current directory')
+    args = parser.parse_args()
+    if len(args.players) < 2:
+        parser.error('need at least two players')
+
+    rank_sums = [0] * len(args.players)
+    for game_number in range(args.games):
+        bots = [InProcessBot(spec) if kind == 'bot' else SubprocessBot(spec, args.width, args.log_dir) for kind, spec in args.players]
+        game = Game(bots, args.width, args.height, args.seed + game_number, args.max_turns)
+        start = time.perf_counter()
+        result = game.run()
+        elapsed = time.perf_counter() - start
+        rank_sums = [total + rank for total, rank in zip(rank_sums, result['ranks'])]
+        print('seed %d:  %d turns in %.1fs (rules %.0f turns/s)  ' % (game.seed, result['turns'], elapsed, result['turns'] / max(result['rules_seconds'], 1e-9))
+              + '  '.join('%s #%d (%d)' % (name, rank, territory) for name, rank, territory in zip(result['names'], result['ranks'], result['territories'])))
+    if args.games > 1:
+        print('mean rank:  ' + '  '.join('%s %.2f' % (spec, total / args.games) for (_, spec), total in zip(args.players, rank_sums)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Parameter sweeps for the bots' argparse options, played out in simulator.py games on every core.
+
+Each configuration plays as player 1 against fixed opponents on a shared series of seeded maps, and scores
+1 - (rank - 1) / (players - 1) per game (1 for a win, 0 for last place).  Configurations are cut down by successive
+halving:  every round, the survivors play `--games` more seeds and only the best 1 / `--eta` of them go on to the
+next round.  The weak ones stop after a few games, and the strong ones collect enough games to tell apart.
+
+Results are cached on disk, one JSON line per game, keyed by the bot, its options, the opponents, the map (size and
+seed), the turn limit and a hash of the repo's code.  Rerunning or widening a sweep only plays the games it hasn't
+seen, and changing any bot code starts afresh.
+
+    python3 sweep.py --bot v26 --grid alpha=0.08,0.1,0.12 --grid potential_degradation_step=0.15,0.2,0.25 --opponents v17
+    python3 sweep.py --bot v26 --grid heads_up_fight=true,false --grid incremental_pf=true,false
+    python3 sweep.py --bot v26 --grid "layer_weights=1 0 0,1 0.5 0.25"
+    python3 sweep.py --bot v17 --sample alpha=uniform:0.05:0.2 --sample hold_until=choice:5,6,7 --samples 16 --sizes 20 30
+"""
+
+import argparse
+import concurrent.futures
+import glob
+import hashlib
+import itertools
+import json
+import os
+import random
+import shlex
+import sys
+
+import simulator
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def code_version():
+    "Hash of every module in the repo, so the cache never mixes results from different code."
+    digest = hashlib.sha1()
+    for path in sorted(glob.glob(os.path.join(HERE, '*.py'))):
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+
+def parse_value(text):
+    if text.lower() in ('true', 'false'):
+        return text.lower() == 'true'      # for store_true options, see bot_spec
+    for kind in (int, float):
+        try:
+            return kind(text)
+        except ValueError:
+            pass
+    words = text.split()
+    if len(words) > 1:
+        values = tuple(map(parse_value, words))
+        if all(isinstance(value, (int, float)) for value in values):
+            return values       # for nargs options such as layer_weights=1 0.5 0.25, see bot_spec
+    return text
+
+
+def grid_configurations(grids):
+    "Every combination of 'name=v1,v2,...' grids, as a list of {name: value}."
+    axes = [(name, [parse_value(value) for value in values.split(',')]) for name, values in (grid.split('=', 1) for grid in grids)]
+    return [dict(zip((name for name, _ in axes), combination)) for combination in itertools.product(*(values for _, values in axes))]
+
+
+def sample_configurations(samples, count, seed):
+    "count draws from 'name=uniform:low:high', 'name=loguniform:low:high', 'name=int:low:high' or 'name=choice:v1,v2' distributions."
+    rng = random.Random(seed)
+    distributions = []
+    for sample in samples:
+        name, spec = sample.split('=', 1)
+        kind, _, rest = spec.partition(':')
+        if kind == 'choice':
+            values = [parse_value(value) for value in rest.split(',')]
+            distributions.append((name, lambda values=values: rng.choice(values)))
+        else:
+            low, high = map(float, rest.split(':'))
+            draw = {'uniform': lambda low=low, high=high: round(rng.uniform(low, high), 4),
+                    'loguniform': lambda low=low, high=high: round(low * (high / low) ** rng.random(), 4),
+                    'int': lambda low=low, high=high: rng.randint(int(low), int(high))}[kind]
+            distributions.append((name, draw))
+    return [{name: draw() for name, draw in distributions} for _ in range(count)]
+
+
+def bot_spec(bot, parameters):
+    """
+    The bot's command line, quoted for simulator.InProcessBot.  True is a bare --flag (store_true options), False leaves
+    the option out and a tuple or list passes its values as separate arguments (nargs options).
+    """
+    argv = [bot]
+    for name, value in sorted(parameters.items()):
+        if value is False:
+            continue
+        argv.append('--%s' % name)
+        if isinstance(value, (tuple, list)):
+            argv.extend(map(str, value))
+        elif value is not True:
+            argv.append(str(value))
+    return shlex.join(argv)
+
+
+def game_key(bot, parameters, opponents, size, seed, max_turns, version):
+    return json.dumps([version, bot, sorted(parameters.items()), opponents, size, seed, max_turns])
+
+
+def play_game(bot, parameters, opponents, size, seed, max_turns):
+    "Worker:  one game with the configuration as player 1.  Returns its score."
+    bots = [simulator.InProcessBot(bot_spec(bot, parameters))] + [simulator.InProcessBot(opponent) for opponent in opponents]
+    result = simulator.Game(bots, size, size, seed, max_turns).run()
+    return 1 - (result['ranks'][0] - 1) / len(opponents)
+
+
+class Cache:
+    "Game scores by game_key, loaded from and appended to a JSON-lines file."
+
+    def __init__(self, path):
+        self.path = path
+        self.scores = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    entry = json.loads(line)
+                    self.scores[entry['key']] = entry['score']
+
+    def __contains__(self, key):
+        return key in self.scores
+
+    def __getitem__(self, key):
+        return self.scores[key]
+
+    def add(self, key, score):
+        self.scores[key] = score
+        if self.path:
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(dict(key=key, score=score)) + '\n')
+
+
+def successive_halving(configurations, args, cache, executor):
+    """
+    Runs the rounds and returns [(mean score, games, configuration)] for every configuration, best first, scored on
+    all the games it got to play.
+    """
+    version = code_version()
+    games_played = 0
+    survivors = list(range(len(configurations)))
+    scores = {index: [] for index in survivors}
+    for round_number in itertools.count():
+        games = [(args.seed + number, args.sizes[(args.seed + number) % len(args.sizes)]) for number in range(games_played, games_played + args.games)]
+        games_played += args.games
+        pending = {}
+        for index in survivors:
+            for seed, size in games:
+                key = game_key(args.bot, configurations[index], args.opponents, size, seed, args.max_turns, version)
+                if key in cache:
+                    scores[index].append(cache[key])
+                else:
+                    future = executor.submit(play_game, args.bot, configurations[index], args.opponents, size, seed, args.max_turns)
+                    pending[future] = (index, key)
+        for future in concurrent.futures.as_completed(pending):
+            index, key = pending[future]
+            try:
+                score = future.result()
+            except (Exception, SystemExit) as error:     # argparse exits on bad options; scored as a loss, and not cached, so the next run plays it again
+                print('game failed, scored 0:  %s on %s:  %r' % (bot_spec(args.bot, configurations[index]), key, error), file=sys.stderr)
+                score = 0
+            else:
+                cache.add(key, score)
+            scores[index].append(score)
+        survivors.sort(key=lambda index: sum(scores[index]) / len(scores[index]), reverse=True)
+        print('round %d:  %d configurations x %d games, best %.3f %s' % (round_number, len(survivors), games_played,
+              sum(scores[survivors[0]]) / len(scores[survivors[0]]), bot_spec(args.bot, configurations[survivors[0]])))
+        if len(survivors) <= 1 or round_number + 1 >= args.rounds:
+            break
+        survivors = survivors[:max(1, len(survivors) // args.eta)]
+    return sorted(((sum(scores[index]) / len(scores[index]), len(scores[index]), configurations[index]) for index in scores),
+                  key=lambda entry: (entry[1], entry[0]), reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Successive-halving parameter sweep over local games, on every core, with a result cache.')
+    parser.add_argument('--bot', type=str, default='v26', help='Bot whose options are swept.  Default is v26')
+    parser.add_argument('--grid', action='append', default=[], help='name=v1,v2,...  Every combination of the grids is a configuration.')
+    parser.add_argument('--sample', action='append', default=[], help='name=uniform:low:high, loguniform:low:high, int:low:high or choice:v1,v2')
+    parser.add_argument('--samples', type=int, default=16, help='Configurations drawn from the --sample distributions.  Default is 16')
+    parser.add_argument('--opponents', nargs='+', default=None, help='Opponent bots (with options, quoted).  Default is the swept bot with its default options.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[30], help='Map sizes, cycled through by seed.  Default is 30')
+    parser.add_argument('--games', type=int, default=4, help='Games per configuration per round.  Default is 4')
+    parser.add_argument('--eta', type=int, default=2, help='Keep the best 1/eta of the configurations after each round.  Default is 2')
+    parser.add_argument('--rounds', type=int, default=4, help='Most rounds to play.  Default is 4')
+    parser.add_argument('--max_turns', type=int, default=None, help='Turn limit per game.  Default is the site\'s 10 * sqrt(width * height)')
+    parser.add_argument('--seed', type=int, default=0, help='First map seed, also seeds --sample.  Default is 0')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Worker processes.  Default is one per core')
+    parser.add_argument('--cache', type=str, default=os.path.join(HERE, 'sweep_cache.jsonl'), help='Cache file; empty string disables it.')
+    args = parser.parse_args()
+    if args.opponents is None:
+        args.opponents = [args.bot]
+
+    configurations = grid_configurations(args.grid) if args.grid else [{}]
+    if args.sample:
+        configurations = [dict(configuration, **sample) for configuration in configurations for sample in sample_configurations(args.sample, args.samples, args.seed)]
+    with concurrent.futures.ProcessPoolExecutor(args.workers) as executor:
+        results = successive_halving(configurations, args, Cache(args.cache), executor)
+    print('%8s %6s  %s' % ('score', 'games', 'configuration'))
+    for score, games, configuration in results:
+        print('%8.3f %6d  %s' % (score, games, bot_spec(args.bot, configuration)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Per-turn telemetry for the erdman bots:  phase timings, a few counts, and end-of-turn resident memory (RSS).
+
+Each turn is one row of floats in a preallocated array used as a ring buffer; nothing is formatted while the game is
+running.  Rows are written out in bulk, as one JSON object per line, when the buffer fills, every `every` turns if
+set, and when the process exits.  The game environment ends bots with SIGKILL, so exit handlers never run there and
+only `every` keeps the end of a game.  A disabled Telemetry (enabled=False) drops everything in end_turn() before touching
+its arguments, so bots can leave the calls in place and guard only the work of computing the counts.
+"""
+
+import atexit
+import json
+import os
+from array import array
+
+PHASES = ('parse', 'features', 'field', 'trees', 'assign', 'plans', 'send')
+COUNTS = ('squares', 'moved', 'pushes', 'marked_dangerous', 'degraded', 'plan_sent')
+# marked_dangerous:  combat cells CombatIndex.commit() flagged;  plan_sent:  1 + the plan variant sent, 0 for the bot's own plan
+FIELDS = ('turn',) + PHASES + COUNTS + ('rss_kb',)
+
+
+class Telemetry:
+    "Ring buffer of per-turn rows (see FIELDS), flushed as JSON lines to path."
+
+    def __init__(self, path, enabled=True, capacity=500, every=10):
+        self.path = path
+        self.enabled = enabled
+        self.capacity = capacity
+        self.every = every
+        self.column = {name: column for column, name in enumerate(FIELDS)}
+        self.rows = array('d', bytes(8 * len(FIELDS) * capacity))
+        self.pending = 0    # rows in the buffer not written out yet
+        self._statm = None  # /proc/self/statm, read for the resident set size at each turn's end (Linux only)
+        if enabled:
+            try:
+                self._statm = os.open('/proc/self/statm', os.O_RDONLY)
+                self._page_kb = os.sysconf('SC_PAGE_SIZE') // 1024
+            except OSError:
+                pass
+            open(path, 'w').close()
+            atexit.register(self.flush)
+
+    def end_turn(self, turn, durations, **counts):
+        "Records a turn:  durations is {phase: seconds} (TurnScheduler.durations), counts are any of COUNTS."
+        if not self.enabled:
+            return
+        width, column = len(FIELDS), self.column
+        start = self.pending * width
+        rows = self.rows
+        rows[start:start + width] = array('d', bytes(8 * width))
+        rows[start] = turn
+        for name, seconds in durations.items():
+            if name in column:
+                rows[start + column[name]] = seconds
+        for name, value in counts.items():
+            rows[start + column[name]] = value
+        if self._statm is not None:
+            rows[start + column['rss_kb']] = int(os.pread(self._statm, 64, 0).split()[1]) * self._page_kb
+        self.pending += 1
+        if self.pending == self.capacity or (self.every and self.pending >= self.every):
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        width = len(FIELDS)
+        with open(self.path, 'a') as f:
+            for row in range(self.pending):
+                values = self.rows[row * width:(row + 1) * width]
+                f.write(json.dumps({name: value if name in PHASES else int(value) for name, value in zip(FIELDS, values)}) + '\n')
+        self.pending = 0
@@ -0,0 +1,126 @@
+"""
+GameMap's precomputed neighborhood tables and batched lookups against the scalar Square-based ones, and its per-player
+statistics against a brute-force recount of every frame of a simulated game.
+
+    python3 -m pytest tests
+"""
+
+import os
+import sys
+import unittest
+from functools import lru_cache
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import hlt
+import simulator
+
+SIZES = [(9, 6), (20, 20), (31, 17)]
+
+
+def game_map(width, height):
+    game = simulator.Game([simulator.InProcessBot('v17') for _ in range(2)], width, height, seed=5, max_turns=1)
+    return hlt.GameMap('%d %d' % (width, height), ' '.join(map(str, game.productions)), game.frame(), arrays=True)
+
+
+class RecordedGame(simulator.Game):
+    "A game that keeps every frame it sends."
+
+    def frame(self):
+        frame = super().frame()
+        self.frames.append(frame)
+        return frame
+
+
+@lru_cache(maxsize=None)
+def recorded_game(width, height, players, seed, turns):
+    "(size_string, production_string, frames) of a v17 game."
+    game = RecordedGame([simulator.InProcessBot('v17 --log_level INFO') for _ in range(players)], width, height, seed, max_turns=turns)
+    game.frames = []
+    game.run()
+    return '%d %d' % (width, height), ' '.join(map(str, game.productions)), game.frames
+
+
+def recount(game_map):
+    "{player: (squares, strength, production, border squares, territory sizes largest first)}, the slow way."
+    width, height = game_map.width, game_map.height
+    owners = list(game_map.owners)
+
+    def neighbors(cell):
+        y, x = divmod(cell, width)
+        return [((y - 1) % height) * width + x, y * width + (x + 1) % width, ((y + 1) % height) * width + x, y * width + (x - 1) % width]
+
+    stats = {}
+    for player in set(owners) | {0}:
+        cells = [cell for cell in range(game_map.size) if owners[cell] == player]
+        unvisited, territories = set(cells), []
+        while unvisited:
+            stack, count = [unvisited.pop()], 0
+            while stack:
+                count += 1
+                for neighbor in neighbors(stack.pop()):
+                    if neighbor in unvisited:
+                        unvisited.remove(neighbor)
+                        stack.append(neighbor)
+            territories.append(count)
+        stats[player] = (len(cells), sum(game_map.strengths[cell] for cell in cells), sum(game_map.productions[cell] for cell in cells),
+                         sum(any(owners[neighbor] != player for neighbor in neighbors(cell)) for cell in cells), tuple(sorted(territories, reverse=True)))
+    return stats
+
+
+class StatisticsTest(unittest.TestCase):
+
+    def check(self, game_map, turn, connectivity):
+        stats = recount(game_map)
+        self.assertEqual(game_map.alive, set(stats) - {0})
+        for player in range(max(stats) + 2):
+            squares, strength, production, border, territories = stats.get(player, (0, 0, 0, 0, []))
+            with self.subTest(turn=turn, player=player):
+                self.assertEqual((game_map.square_counts[player], game_map.strength_totals[player], game_map.production_totals[player], game_map.border_counts[player]),
+                                 (squares, strength, production, border))
+                if connectivity and player in game_map.alive:
+                    self.assertEqual(game_map.connectivity(player), territories)
+
+    def test_statistics_match_recount(self):
+        for width, height, players, seed in ((20, 20, 4, 3), (17, 23, 3, 8)):
+            size_string, production_string, frames = recorded_game(width, height, players, seed, 150)
+            decoded = hlt.GameMap(size_string, production_string, frames[0], arrays=True)     # through get_frame
+            copied = hlt.GameMap(size_string, production_string, frames[0], arrays=True)      # through set_frame
+            self.assertEqual(decoded.starting_player_count, players)
+            for turn, frame in enumerate(frames):
+                decoded.get_frame(frame)
+                copied.set_frame(bytes(decoded.owners), bytes(decoded.strengths))
+                self.check(decoded, turn, connectivity=True)
+                self.check(copied, turn, connectivity=turn % 7 == 0)    # asked now and then, so the cache spans frames
+
+
+class BatchedLookupTest(unittest.TestCase):
+
+    def test_get_targets_matches_get_target(self):
+        for width, height in SIZES:
+            m = game_map(width, height)
+            cells = list(range(m.size))
+            for direction in (hlt.NORTH, hlt.EAST, hlt.SOUTH, hlt.WEST, hlt.STILL):
+                with self.subTest(size=(width, height), direction=direction):
+                    self.assertEqual(m.get_targets(cells, direction), [m.index(m.get_target(m.square(cell), direction)) for cell in cells])
+            directions = [cell * 7 % 5 for cell in cells]
+            with self.subTest(size=(width, height), direction='per cell'):
+                self.assertEqual(m.get_targets(cells, directions),
+                                 [m.index(m.get_target(m.square(cell), direction)) for cell, direction in zip(cells, directions)])
+
+    def test_get_distances_matches_get_distance(self):
+        for width, height in SIZES:
+            m = game_map(width, height)
+            cells = list(range(m.size))
+            for index in cells:
+                with self.subTest(size=(width, height), index=index):
+                    expected = [m.get_distance(m.square(index), m.square(cell)) for cell in cells]
+                    y, x = divmod(index, width)
+                    self.assertEqual(expected, [min(abs(x - cell % width), width - abs(x - cell % width)) + min(abs(y - cell // width), height - abs(y - cell // width))
+                                                for cell in cells])
+                    self.assertEqual(m.get_distances(index, cells), expected)
+                    self.assertEqual([m.cell_distance(index, cell) for cell in cells], expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+"""
+PotentialField.repair() against compute(), and stack() / combine() after a repair against degraded(), on the frames of a
+simulated game, from every player's point of view.
+
+    python3 -m pytest tests
+"""
+
+import os
+import sys
+import unittest
+from functools import lru_cache
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import hlt
+import potential_field
+import simulator
+from features import FeatureMaps
+
+WIDTH, HEIGHT, PLAYERS, SEED, TURNS = 25, 25, 3, 11, 80
+
+
+class RecordedGame(simulator.Game):
+    "A game that keeps every frame it sends."
+
+    def frame(self):
+        frame = super().frame()
+        self.frames.append(frame)
+        return frame
+
+
+@lru_cache(maxsize=None)
+def recorded_game():
+    "(size_string, production_string, frames) of a short v17 game."
+    game = RecordedGame([simulator.InProcessBot('v17') for _ in range(PLAYERS)], WIDTH, HEIGHT, SEED, max_turns=TURNS)
+    game.frames = []
+    game.run()
+    return '%d %d' % (WIDTH, HEIGHT), ' '.join(map(str, game.productions)), game.frames
+
+
+def replay(my_id):
+    "Yields (game_map, features, initial, wall) for each of my_id's turns, the way v26 builds its field inputs."
+    size_string, production_string, frames = recorded_game()
+    game_map = hlt.GameMap(size_string, production_string, frames[0], arrays=True)
+    features = FeatureMaps(game_map, my_id)
+    for frame in frames[1:]:
+        game_map.get_frame(frame)
+        if my_id not in game_map.alive:
+            return
+        features.update()
+        wall = features.wall({0, my_id})
+        yield game_map, features, features.initial_potential(-0.5, wall=wall), wall
+
+
+class RepairTest(unittest.TestCase):
+
+    def test_repair_matches_compute(self):
+        for my_id in range(1, PLAYERS + 1):
+            rebuilt = repaired = None
+            for turn, (game_map, _, initial, wall) in enumerate(replay(my_id)):
+                if rebuilt is None:
+                    rebuilt = potential_field.PotentialField(game_map, 0.1, 0.2)
+                    repaired = potential_field.PotentialField(game_map, 0.1, 0.2, max_repair=1.0)   # never falls back
+                rebuilt.compute(my_id, initial, wall)
+                repaired.repair(my_id, initial, game_map.changed, wall)
+                with self.subTest(player=my_id, turn=turn):
+                    self.assertEqual(list(repaired.potential), list(rebuilt.potential))
+                    self.assertEqual(list(repaired.distance), list(rebuilt.distance))
+                    self.assertEqual(list(repaired.parent), list(rebuilt.parent))
+
+    def test_combine_matches_degraded_after_repair(self):
+        for my_id in range(1, PLAYERS + 1):
+            field = None
+            for turn, (game_map, features, initial, wall) in enumerate(replay(my_id)):
+                if field is None:
+                    field = potential_field.PotentialField(game_map, 0.1, 0.2, max_repair=1.0)
+                field.repair(my_id, initial, game_map.changed, wall)
+                field.stack(my_id, *features.source_layers(wall=wall))
+                with self.subTest(player=my_id, turn=turn):
+                    for combined, degraded in zip(field.combine((1, -0.5, 0.2)), field.degraded()):
+                        if combined != degraded:
+                            self.assertAlmostEqual(combined, degraded, places=9)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+"""
+Recorder / Recording round trips:  every turn read back in random order, files cut short by a killed bot, and games
+recorded by in-process bots in the simulator.
+
+    python3 -m pytest tests
+"""
+
+import os
+import random
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import hlt
+import recording
+import simulator
+from test_potential_field import RecordedGame, recorded_game
+
+
+def record_game(path, keyframe_interval=recording.KEYFRAME_INTERVAL):
+    "Records player 1's view of test_potential_field's game to path, with made-up directions.  Returns the expected frames."
+    size_string, production_string, frames = recorded_game()
+    game_map = hlt.GameMap(size_string, production_string, frames[0], arrays=True)
+    recorder = recording.Recorder(path, game_map, 1, keyframe_interval)
+    expected = []
+    for turn, frame in enumerate(frames):
+        game_map.get_frame(frame)
+        directions = game_map.blank_moves()
+        for cell in range(game_map.size):
+            if game_map.owners[cell] == 1:
+                directions[cell] = (cell + turn) % 5
+        recorder.record(game_map, directions)
+        expected.append((bytes(game_map.owners), bytes(game_map.strengths), bytes(directions)))
+    recorder.close()
+    return game_map, expected
+
+
+class RecordingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = os.path.join(self.directory.name, 'game.hrec')
+
+    def assertFrames(self, game, expected, order):
+        for n in order:
+            with self.subTest(turn=n):
+                self.assertEqual(tuple(map(bytes, game.frame(n))), expected[n])
+
+    def test_random_access(self):
+        for keyframe_interval in (1, 5, recording.KEYFRAME_INTERVAL):
+            game_map, expected = record_game(self.path, keyframe_interval)
+            game = recording.Recording(self.path)
+            self.assertEqual((game.width, game.height, game.player, len(game)), (game_map.width, game_map.height, 1, len(expected)))
+            self.assertEqual(bytes(game.productions), bytes(game_map.productions))
+            order = list(range(len(expected))) * 2
+            random.Random(keyframe_interval).shuffle(order)
+            self.assertFrames(game, expected, order)
+            self.assertEqual([tuple(map(bytes, frame)) for frame in game], expected)
+            with self.assertRaises(IndexError):
+                game.frame(len(expected))
+            game.close()
+
+    def test_killed_before_the_index(self):
+        _, expected = record_game(self.path)
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        index, count, _ = recording.FOOTER.unpack_from(data, len(data) - recording.FOOTER.size)
+        self.assertEqual(count, len(expected))
+        for end, records in ((index, count), (index - 3, count - 1)):   # every record written, then the last one cut off
+            with open(self.path, 'wb') as f:
+                f.write(data[:end])
+            game = recording.Recording(self.path)
+            self.assertEqual(len(game), records)
+            self.assertFrames(game, expected, reversed(range(records)))
+            game.close()
+
+    def test_in_process_bot(self):
+        name = os.path.join(self.directory.name, 'recorded')
+        bot = simulator.InProcessBot('v17 --record --log_level INFO --name ' + name)
+        game = RecordedGame([bot, simulator.InProcessBot('v17 --log_level INFO')], 20, 20, 4, max_turns=60)
+        game.frames = []
+        turns = game.run()['turns']
+        bot.game_map.recorder.close()   # what the bot's exit would do
+        played = recording.Recording(name + '.hrec')
+        self.assertEqual(len(played), turns)
+        reader = hlt.GameMap('20 20', ' '.join(map(str, game.productions)), game.frames[0], arrays=True)
+        for n in range(turns):
+            reader.get_frame(game.frames[n])
+            owners, strengths, directions = played.frame(n)
+            with self.subTest(turn=n):
+                self.assertEqual((bytes(owners), bytes(strengths)), (bytes(reader.owners), bytes(reader.strengths)))
+                self.assertTrue(all(direction == hlt.NO_MOVE for owner, direction in zip(owners, directions) if owner != 1))
+        played.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
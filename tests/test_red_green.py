@@ -0,0 +1,85 @@
+"""
+RedGreenTrees against the nested-dict trees, walk_tree and sort/groupby lights v26 used before it, on v26's pf maps for
+every turn of a simulated game, from every player's point of view.
+
+    python3 -m pytest tests
+"""
+
+import os
+import sys
+import unittest
+from collections import defaultdict
+from itertools import groupby
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import potential_field
+from red_green import RedGreenTrees
+from test_potential_field import PLAYERS, replay
+
+
+def walk_tree(d, level=1):
+    for key, sub_d in d.items():
+        yield level, key
+        yield from walk_tree(sub_d, level + 1)
+
+
+def old_lights(game_map, my_id, pf_map):
+    "(redlight, greenlight, rootlookup) the way v26 built them before red_green.py."
+    owners, strengths, productions = game_map.owners, game_map.strengths, game_map.productions
+    trees = defaultdict(dict)
+    edges = [(min((neighbor for neighbor in game_map.cell_neighbors(square)), key=lambda x: pf_map[x]), square) for square in range(game_map.size) if owners[square] == my_id]
+    for parent, child in edges:
+        trees[parent][child] = trees[child]
+    parents, children = zip(*edges)
+    roots = set(parents).difference(children)
+    trees = {root: trees[root] for root in roots if owners[root] == 0 and strengths[root] > 0}
+    rootlookup = {node: root for root, tree in trees.items() for _, node in walk_tree(tree)}
+    redlight = set()
+    greenlight = set()
+    for root, tree in trees.items():
+        accum_production = accum_strength = 0
+        for distance, level in groupby(sorted(walk_tree(tree), key=lambda x: (x[0], x[1] % game_map.width, x[1])), key=lambda x: x[0]):
+            squares = list(list(zip(*level))[1])
+            level_strength = sum(strengths[square] for square in squares)
+            level_production = sum(productions[square] for square in squares)
+            if accum_strength + accum_production > strengths[root]:
+                break
+            elif level_strength + accum_strength + accum_production > strengths[root]:
+                squares.sort(key=lambda x: strengths[x], reverse=True)
+                while level_strength + accum_strength + accum_production - strengths[squares[-1]] > strengths[root]:
+                    level_strength -= strengths[squares.pop()]
+                greenlight.update(squares)
+                break
+            else:
+                accum_strength += level_strength + accum_production
+                accum_production += level_production
+                redlight.update(squares)
+    return redlight, greenlight, rootlookup
+
+
+class LightsTest(unittest.TestCase):
+
+    def test_lights_match_walk_tree(self):
+        greenlit = 0
+        for my_id in range(1, PLAYERS + 1):
+            field = trees = None
+            for turn, (game_map, _, initial, wall) in enumerate(replay(my_id)):
+                if field is None:
+                    field = potential_field.PotentialField(game_map, 0.1, 0.2, neutral_only=True)
+                    trees = RedGreenTrees(game_map, my_id)
+                field.compute(my_id, initial, wall)
+                pf_map = field.degraded()
+                trees.build(pf_map)
+                redlight, greenlight = trees.lights()
+                old_redlight, old_greenlight, rootlookup = old_lights(game_map, my_id, pf_map)
+                greenlit += len(greenlight)
+                with self.subTest(player=my_id, turn=turn):
+                    self.assertEqual(redlight, old_redlight)
+                    self.assertEqual(greenlight, old_greenlight)
+                    self.assertEqual({square: root for square, root in enumerate(trees.root) if root >= 0}, rootlookup)
+        self.assertGreater(greenlit, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()